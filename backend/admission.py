@@ -0,0 +1,218 @@
+"""Admission control for /stream calls.
+
+A call needs a slot before it opens an upstream socket. Slots are capped
+per process (MAX_ACTIVE_CALLS) and per team (TEAM_MAX_ACTIVE_CALLS, or
+Team.max_active_calls when set); 0 means no cap. Calls without a team
+(no or an unknown user_id, or a user with no team) share one bucket
+capped by TEAM_MAX_ACTIVE_CALLS, so leaving out user_id does not escape
+the team caps. Calls that do not get a slot wait in a queue of at most
+ADMISSION_QUEUE_SIZE entries:
+- managers and admins are served before reps, first come first served
+  within a priority (main.py decides whether a caller's role is trusted);
+- a waiter whose team is at its cap is skipped, so other teams' calls
+  can use the free slot;
+- a higher-priority arrival at a full queue evicts the newest
+  lowest-priority waiter;
+- waiters give up after ADMISSION_QUEUE_TIMEOUT seconds.
+
+Each waiter is told its position whenever it changes. Draining refuses
+new calls and empties the queue, while calls that are in progress run to
+completion.
+"""
+import os
+import bisect
+import asyncio
+import logging
+import itertools
+from collections import Counter
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIVE_CALLS = int(os.getenv("MAX_ACTIVE_CALLS", "0"))
+TEAM_MAX_ACTIVE_CALLS = int(os.getenv("TEAM_MAX_ACTIVE_CALLS", "0"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "120"))
+
+PRIORITY_MANAGER = 0
+PRIORITY_REP = 1
+MANAGER_ROLES = ("admin", "manager")
+
+# Rejection reasons, also the admission_rejected metric label
+DRAINING = "draining"
+QUEUE_FULL = "queue_full"
+TIMEOUT = "timeout"
+
+
+def priority_for(role: str) -> int:
+    return PRIORITY_MANAGER if role in MANAGER_ROLES else PRIORITY_REP
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Slot:
+    """A granted call slot; release() is idempotent."""
+
+    def __init__(self, controller, team_id):
+        self.controller = controller
+        self.team_id = team_id
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int, team_id, team_limit: int):
+        self.priority = priority
+        self.seq = seq
+        self.team_id = team_id
+        self.team_limit = team_limit
+        self.future = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Event()
+        self.position = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    def __init__(self, max_active: int = MAX_ACTIVE_CALLS, team_max_active: int = TEAM_MAX_ACTIVE_CALLS,
+                 queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.team_max_active = team_max_active
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.team_active = Counter()
+        self.waiting = []  # sorted by (priority, arrival)
+        self.draining = False
+        self._seq = itertools.count()
+        metrics.admission_queue_depth.set_function(lambda: len(self.waiting))
+
+    def _fits(self, team_id, team_limit: int) -> bool:
+        if self.max_active and self.active >= self.max_active:
+            return False
+        limit = team_limit or self.team_max_active
+        return not limit or self.team_active[team_id] < limit
+
+    def _grant(self, team_id) -> Slot:
+        self.active += 1
+        self.team_active[team_id] += 1
+        return Slot(self, team_id)
+
+    def _release(self, slot: Slot):
+        self.active -= 1
+        self.team_active[slot.team_id] -= 1
+        if not self.team_active[slot.team_id]:
+            del self.team_active[slot.team_id]
+        self._promote()
+
+    def _promote(self):
+        """Hand free slots to the first eligible waiters, then refresh positions."""
+        for waiter in list(self.waiting):
+            if self.max_active and self.active >= self.max_active:
+                break
+            if self._fits(waiter.team_id, waiter.team_limit):
+                self.waiting.remove(waiter)
+                waiter.future.set_result(self._grant(waiter.team_id))
+        self._update_positions()
+
+    def _update_positions(self):
+        for index, waiter in enumerate(self.waiting):
+            if waiter.position != index + 1:
+                waiter.position = index + 1
+                waiter.changed.set()
+
+    def _reject(self, waiter: _Waiter, reason: str):
+        self.waiting.remove(waiter)
+        waiter.future.set_exception(AdmissionRejected(reason))
+
+    def try_acquire(self, team_id=None, team_limit: int = 0):
+        """A slot if one is free right now, else None."""
+        if self.draining:
+            metrics.admission_rejected.labels(DRAINING).inc()
+            raise AdmissionRejected(DRAINING)
+        if self._fits(team_id, team_limit):
+            return self._grant(team_id)
+        return None
+
+    async def acquire(self, team_id=None, team_limit: int = 0, priority: int = PRIORITY_REP, on_position=None) -> Slot:
+        """Wait in the queue for a slot; ``on_position(n)`` is awaited whenever the position changes."""
+        slot = self.try_acquire(team_id, team_limit)
+        if slot is not None:
+            return slot
+        if len(self.waiting) >= self.queue_size:
+            last = self.waiting[-1] if self.waiting else None
+            if last is None or last.priority <= priority:
+                metrics.admission_rejected.labels(QUEUE_FULL).inc()
+                raise AdmissionRejected(QUEUE_FULL)
+            self._reject(last, QUEUE_FULL)
+        waiter = _Waiter(priority, next(self._seq), team_id, team_limit)
+        bisect.insort(self.waiting, waiter)
+        self._update_positions()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.queue_timeout
+        try:
+            while not waiter.future.done():
+                if waiter.changed.is_set():
+                    waiter.changed.clear()
+                    if on_position is not None:
+                        await on_position(waiter.position)
+                    continue
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                try:
+                    await asyncio.wait({waiter.future, changed}, timeout=deadline - loop.time(),
+                                       return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+                if not waiter.future.done() and loop.time() >= deadline:
+                    self._reject(waiter, TIMEOUT)
+                    self._update_positions()
+            slot = waiter.future.result()
+        except AdmissionRejected as e:
+            metrics.admission_rejected.labels(e.reason).inc()
+            raise
+        except BaseException:
+            # Caller went away (cancelled or a failed position update)
+            if waiter in self.waiting:
+                self.waiting.remove(waiter)
+                self._update_positions()
+            elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                waiter.future.result().release()
+            raise
+        metrics.admission_wait_seconds.observe(loop.time() - started)
+        return slot
+
+    def drain(self):
+        """Refuse new calls and empty the queue; calls in progress keep their slots."""
+        self.draining = True
+        for waiter in list(self.waiting):
+            self._reject(waiter, DRAINING)
+        logger.info("Draining: %s active calls left", self.active)
+
+    def resume(self):
+        self.draining = False
+        logger.info("Admitting calls again")
+
+    def status(self) -> dict:
+        return {
+            "draining": self.draining,
+            "active": self.active,
+            "max_active": self.max_active,
+            "queued": len(self.waiting),
+            "queue_size": self.queue_size,
+            "teams": {"none" if team_id is None else str(team_id): count
+                      for team_id, count in self.team_active.items()},
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,187 @@
+"""Pre-aggregated team and template performance.
+
+Whenever a session is scored, apply_feedback() writes the normalized
+outcome next to the raw feedback:
+- Session.score and Session.follow_up_booked;
+- one session_goal_outcomes row per goal;
+- deltas into daily_rollups and daily_goal_rollups, keyed by
+  (day, template, team). Goal rollups count attempts as well as
+  achievements, so a goal's rate only covers sessions that had it.
+
+A re-score backs the previous outcome out of the rollups before adding the
+new one. Sessions whose score is still NULL were never counted, so nothing
+is backed out for them. The read helpers only touch the rollup tables,
+i.e. at most one row per day per key.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, insert, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Session as SessionModel, SessionGoalOutcome, DailyRollup, DailyGoalRollup, Team
+from crud import get_scoring_rows
+
+FOLLOW_UP_DETAIL = "Follow-up"
+NO_TEAM = 0
+
+
+def outcome(feedback: dict):
+    """Return (score, follow_up_booked, {goal: achieved}) for a feedback dict."""
+    feedback = feedback or {}
+    details = feedback.get("details") or {}
+    goals = {goal: status == "Achieved" for goal, status in details.items() if goal != FOLLOW_UP_DETAIL}
+    return float(feedback.get("score") or 0.0), details.get(FOLLOW_UP_DETAIL) == "Booked", goals
+
+
+def _upsert(db: AsyncSession, model, rows: list, keys: list, counters: list):
+    insert_ = sqlite_insert if db.bind.dialect.name == "sqlite" else pg_insert
+    stmt = insert_(model).values(rows)
+    columns = model.__table__.c
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: columns[name] + stmt.excluded[name] for name in counters},
+    )
+
+
+async def apply_feedback(db: AsyncSession, feedbacks: dict, extra: dict = None):
+    """Store new feedback and fold it into the rollups, in one transaction.
+
+    ``feedbacks`` maps session id to the new feedback and ``extra`` to
+    additional Session column values. The stored outcome that is backed out
+    is read (and locked) in this transaction, so concurrent scorers of the
+    same session cannot both back out the same old value.
+    """
+    extra = extra or {}
+    sessions = await get_scoring_rows(db, list(feedbacks))
+    totals = {}
+    goal_totals = {}
+    updates = []
+    outcomes = []
+    for row in sessions:
+        created_at = row.created_at or datetime.utcnow()
+        key = (created_at.date(), row.template_id, row.team_id or NO_TEAM)
+        total = totals.setdefault(key, [0, 0.0, 0])
+        if row.score is not None:
+            old_score, old_follow_up, old_goals = outcome(row.feedback)
+            total[0] -= 1
+            total[1] -= old_score
+            total[2] -= int(old_follow_up)
+            for goal, achieved in old_goals.items():
+                goal_total = goal_totals.setdefault(key + (goal,), [0, 0])
+                goal_total[0] -= int(achieved)
+                goal_total[1] -= 1
+        feedback = feedbacks[row.id]
+        score, follow_up, goals = outcome(feedback)
+        total[0] += 1
+        total[1] += score
+        total[2] += int(follow_up)
+        for goal, achieved in goals.items():
+            goal_total = goal_totals.setdefault(key + (goal,), [0, 0])
+            goal_total[0] += int(achieved)
+            goal_total[1] += 1
+            outcomes.append({
+                "session_id": row.id,
+                "template_id": row.template_id,
+                "team_id": row.team_id,
+                "goal": goal,
+                "achieved": achieved,
+                "created_at": created_at,
+            })
+        updates.append({"id": row.id, "feedback": feedback, "score": score, "follow_up_booked": follow_up,
+                        **extra.get(row.id, {})})
+
+    if not updates:
+        return
+    await db.execute(update(SessionModel), updates)
+    await db.execute(delete(SessionGoalOutcome).where(SessionGoalOutcome.session_id.in_([row.id for row in sessions])))
+    if outcomes:
+        await db.execute(insert(SessionGoalOutcome), outcomes)
+
+    rollups = [
+        {"day": day, "template_id": template_id, "team_id": team_id,
+         "sessions": count, "score_sum": score_sum, "follow_ups": follow_ups}
+        for (day, template_id, team_id), (count, score_sum, follow_ups) in totals.items()
+        if count or score_sum or follow_ups
+    ]
+    if rollups:
+        await db.execute(_upsert(db, DailyRollup, rollups, ["day", "template_id", "team_id"],
+                                 ["sessions", "score_sum", "follow_ups"]))
+    goal_rollups = [
+        {"day": day, "template_id": template_id, "team_id": team_id, "goal": goal,
+         "achieved": achieved, "attempts": attempts}
+        for (day, template_id, team_id, goal), (achieved, attempts) in goal_totals.items()
+        if achieved or attempts
+    ]
+    if goal_rollups:
+        await db.execute(_upsert(db, DailyGoalRollup, goal_rollups, ["day", "template_id", "team_id", "goal"],
+                                 ["achieved", "attempts"]))
+    await db.commit()
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+async def summary(db: AsyncSession, days: int, template_id: int = None, team_id: int = None) -> dict:
+    """Totals, per-goal achievement rates and a daily series from the rollups."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    filters = [DailyRollup.day >= since]
+    goal_filters = [DailyGoalRollup.day >= since]
+    if template_id is not None:
+        filters.append(DailyRollup.template_id == template_id)
+        goal_filters.append(DailyGoalRollup.template_id == template_id)
+    if team_id is not None:
+        filters.append(DailyRollup.team_id == team_id)
+        goal_filters.append(DailyGoalRollup.team_id == team_id)
+
+    daily_rows = (await db.execute(
+        select(DailyRollup.day, func.sum(DailyRollup.sessions), func.sum(DailyRollup.score_sum),
+               func.sum(DailyRollup.follow_ups))
+        .where(*filters).group_by(DailyRollup.day).order_by(DailyRollup.day)
+    )).all()
+    goal_rows = (await db.execute(
+        select(DailyGoalRollup.goal, func.sum(DailyGoalRollup.achieved), func.sum(DailyGoalRollup.attempts))
+        .where(*goal_filters).group_by(DailyGoalRollup.goal)
+    )).all()
+
+    sessions = sum(row[1] or 0 for row in daily_rows)
+    score_sum = sum(row[2] or 0 for row in daily_rows)
+    follow_ups = sum(row[3] or 0 for row in daily_rows)
+    return {
+        "template_id": template_id,
+        "team_id": team_id,
+        "days": days,
+        "sessions": sessions,
+        "avg_score": _rate(score_sum, sessions),
+        "follow_up_rate": _rate(follow_ups, sessions),
+        "goals": {goal: _rate(achieved or 0, attempts) for goal, achieved, attempts in goal_rows},
+        "daily": [
+            {"day": day.isoformat(), "sessions": count, "avg_score": _rate(day_score or 0, count),
+             "follow_up_rate": _rate(day_follow_ups or 0, count)}
+            for day, count, day_score, day_follow_ups in daily_rows
+        ],
+    }
+
+
+async def leaderboard(db: AsyncSession, days: int, template_id: int = None, limit: int = 20) -> list:
+    """Teams ranked by average score over the window."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    sessions = func.sum(DailyRollup.sessions)
+    avg_score = func.sum(DailyRollup.score_sum) / sessions
+    stmt = (
+        select(DailyRollup.team_id, sessions, avg_score, func.sum(DailyRollup.follow_ups))
+        .where(DailyRollup.day >= since, DailyRollup.team_id != NO_TEAM)
+        .group_by(DailyRollup.team_id)
+        .having(sessions > 0)
+        .order_by(avg_score.desc())
+        .limit(limit)
+    )
+    if template_id is not None:
+        stmt = stmt.where(DailyRollup.template_id == template_id)
+    rows = (await db.execute(stmt)).all()
+    names = dict((await db.execute(select(Team.id, Team.name).where(Team.id.in_([row[0] for row in rows])))).all())
+    return [
+        {"team_id": team_id, "team_name": names.get(team_id), "sessions": count,
+         "avg_score": round(score, 4), "follow_up_rate": _rate(follow_ups or 0, count)}
+        for team_id, count, score, follow_ups in rows
+    ]
@@ -0,0 +1,379 @@
+"""Archive tier for finished sessions.
+
+Sessions older than ARCHIVE_AFTER_DAYS leave Postgres in batches of
+ARCHIVE_BATCH_SIZE. Each worker runs a pass every ARCHIVE_INTERVAL
+seconds; FOR UPDATE SKIP LOCKED keeps workers off each other's batches.
+``python archive.py`` runs a pass by hand. For every batch:
+- the turns are written as zstd-compressed Parquet under ARCHIVE_DIR, one
+  row per turn, partitioned as ``template_id=<id>/day=<YYYY-MM-DD>/``
+  (readable with pyarrow.dataset or DuckDB);
+- the turns go into a SQLite FTS5 index, ARCHIVE_DIR/index.sqlite. Its
+  trigram tokenizer matches any substring of 3+ characters, whatever the
+  Hinglish spelling around it;
+- the session_turns rows are deleted, Session.transcript is nulled and
+  Session.archived_at is set.
+
+The Parquet files are the durable copy; ``python archive.py --reindex``
+rebuilds the index from them. Index rowids are session_id * 2**20 + seq,
+so one session's turns are a rowid range. pyarrow is only imported when
+files are written or read.
+
+The index runs in WAL mode, which needs ARCHIVE_DIR on a local disk: set
+it on one host only. That host archives, serves /archive and re-scores
+archived sessions; other hosts skip archived sessions when re-scoring.
+"""
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Loaded before database.py reads DATABASE_URL, for ``python archive.py``
+load_dotenv()
+
+from sqlalchemy import select, update, delete, or_  # noqa: E402
+from database import AsyncSessionLocal  # noqa: E402
+from models import Session as SessionModel, SessionTurn  # noqa: E402
+import metrics  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Unset disables archiving and the /archive endpoints
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # 0 = only `python archive.py`
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+INDEX_FILE = "index.sqlite"
+SEQ_BITS = 20
+MIN_QUERY_CHARS = 3  # shortest string a trigram index can match
+
+INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns USING fts5(
+    content, role UNINDEXED, session_id UNINDEXED, seq UNINDEXED, template_id UNINDEXED,
+    team_id UNINDEXED, user_id UNINDEXED, day UNINDEXED, tokenize = 'trigram'
+);
+CREATE TABLE IF NOT EXISTS archived_sessions (
+    session_id INTEGER PRIMARY KEY, template_id INTEGER, team_id INTEGER, user_id INTEGER,
+    day TEXT, turns INTEGER, path TEXT
+);
+"""
+
+
+def legacy_turns(transcript) -> list:
+    """Turns of a pre-session_turns Session.transcript (a JSON-encoded list of {role, content})."""
+    if isinstance(transcript, str):
+        try:
+            transcript = json.loads(transcript)
+        except ValueError:
+            return []
+    if not isinstance(transcript, list):
+        return []
+    return [
+        {"role": entry.get("role"), "content": entry["content"]}
+        for entry in transcript if isinstance(entry, dict) and isinstance(entry.get("content"), str)
+    ]
+
+
+def _rowid(session_id: int, seq: int) -> int:
+    return (session_id << SEQ_BITS) + seq
+
+
+def _fts_phrase(text: str) -> str:
+    # Searched as one literal phrase, never as FTS5 query syntax
+    return '"' + text.replace('"', '""') + '"'
+
+
+class ArchiveIndex:
+    """The full-text index and the registry of archived sessions.
+
+    Blocking sqlite3 calls; the async helpers below run them in a thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        # Searches keep reading while a pass writes; WAL needs a local disk
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(INDEX_SCHEMA)
+        return conn
+
+    def archived(self, conn, session_ids: list) -> set:
+        marks = ",".join("?" * len(session_ids))
+        return {row[0] for row in conn.execute(
+            f"SELECT session_id FROM archived_sessions WHERE session_id IN ({marks})", session_ids)}
+
+    def add(self, conn, sessions: list, turns: list):
+        conn.executemany(
+            "INSERT INTO turns (rowid, content, role, session_id, seq, template_id, team_id, user_id, day) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(_rowid(turn["session_id"], turn["seq"]), turn["content"], turn["role"], turn["session_id"],
+              turn["seq"], turn["template_id"], turn["team_id"], turn["user_id"], turn["day"]) for turn in turns],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO archived_sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(s["session_id"], s["template_id"], s["team_id"], s["user_id"], s["day"], s["turns"], s["path"])
+             for s in sessions],
+        )
+
+    def search(self, query: str, role: str = None, template_id: int = None, team_id: int = None,
+               user_id: int = None, since: str = None, until: str = None, limit: int = 50) -> list:
+        sql = ["SELECT session_id, seq, role, template_id, team_id, user_id, day,"
+               " snippet(turns, 0, '[', ']', '...', 64) FROM turns WHERE turns MATCH ?"]
+        params = [_fts_phrase(query)]
+        for column, value in (("role", role), ("template_id", template_id), ("team_id", team_id),
+                              ("user_id", user_id)):
+            if value is not None:
+                sql.append(f"AND {column} = ?")
+                params.append(value)
+        if since is not None:
+            sql.append("AND day >= ?")
+            params.append(since)
+        if until is not None:
+            sql.append("AND day <= ?")
+            params.append(until)
+        sql.append("ORDER BY rank LIMIT ?")
+        params.append(limit)
+        with closing(self.connect()) as conn:
+            rows = conn.execute(" ".join(sql), params).fetchall()
+        return [
+            {"session_id": session_id, "seq": seq, "role": role, "template_id": template_id, "team_id": team_id,
+             "user_id": user_id, "day": day, "snippet": snippet}
+            for session_id, seq, role, template_id, team_id, user_id, day, snippet in rows
+        ]
+
+    def transcript(self, session_id: int):
+        with closing(self.connect()) as conn:
+            session = conn.execute(
+                "SELECT template_id, team_id, user_id, day FROM archived_sessions WHERE session_id = ?",
+                (session_id,)).fetchone()
+            if session is None:
+                return None
+            turns = conn.execute(
+                "SELECT seq, role, content FROM turns WHERE rowid BETWEEN ? AND ? ORDER BY rowid",
+                (_rowid(session_id, 0), _rowid(session_id + 1, 0) - 1)).fetchall()
+        template_id, team_id, user_id, day = session
+        return {"session_id": session_id, "template_id": template_id, "team_id": team_id, "user_id": user_id,
+                "day": day, "turns": [{"seq": seq, "role": role, "content": content} for seq, role, content in turns]}
+
+    def user_text(self, session_ids: list) -> dict:
+        texts = {}
+        with closing(self.connect()) as conn:
+            for session_id in session_ids:
+                parts = [content for (content,) in conn.execute(
+                    "SELECT content FROM turns WHERE rowid BETWEEN ? AND ? AND role = 'user' ORDER BY rowid",
+                    (_rowid(session_id, 0), _rowid(session_id + 1, 0) - 1))]
+                if parts:
+                    texts[session_id] = " ".join(parts)
+        return texts
+
+
+archive_index = ArchiveIndex(os.path.join(ARCHIVE_DIR, INDEX_FILE)) if ARCHIVE_DIR else None
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("session_id", pa.int64()),
+        ("seq", pa.int32()),
+        ("role", pa.dictionary(pa.int8(), pa.string())),
+        ("content", pa.string()),
+        ("user_id", pa.int64()),
+        ("team_id", pa.int64()),
+        ("created_at", pa.timestamp("ms")),
+    ])
+
+
+def write_partition(template_id: int, day: str, turns: list) -> str:
+    """Write one partition file atomically; returns its path."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    directory = os.path.join(ARCHIVE_DIR, f"template_id={template_id}", f"day={day}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{uuid.uuid4().hex[:16]}.parquet")
+    schema = _parquet_schema()
+    table = pa.Table.from_pylist([{name: turn[name] for name in schema.names} for turn in turns], schema=schema)
+    pq.write_table(table, path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def store(sessions: list, turns: list) -> int:
+    """Write files and index entries for a batch; sessions already in the index are skipped."""
+    with closing(archive_index.connect()) as conn:
+        done = archive_index.archived(conn, [session["session_id"] for session in sessions])
+        sessions = [session for session in sessions if session["session_id"] not in done]
+        turns = [turn for turn in turns if turn["session_id"] not in done]
+        partitions = {}
+        for turn in turns:
+            partitions.setdefault((turn["template_id"], turn["day"]), []).append(turn)
+        paths = {key: write_partition(key[0], key[1], rows) for key, rows in partitions.items()}
+        for session in sessions:
+            session["path"] = paths.get((session["template_id"], session["day"]))
+        with conn:
+            archive_index.add(conn, sessions, turns)
+    return len(turns)
+
+
+async def archive_batch(before: datetime, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive up to ``limit`` sessions created before ``before``; returns how many were archived."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(SessionModel.id, SessionModel.template_id, SessionModel.team_id, SessionModel.user_id,
+                   SessionModel.created_at, SessionModel.transcript)
+            .where(SessionModel.archived_at.is_(None),
+                   or_(SessionModel.created_at < before, SessionModel.created_at.is_(None)))
+            .order_by(SessionModel.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not rows:
+            return 0
+        ids = [row.id for row in rows]
+        hot = {}
+        for turn in (await db.execute(
+            select(SessionTurn.session_id, SessionTurn.seq, SessionTurn.role, SessionTurn.content,
+                   SessionTurn.created_at)
+            .where(SessionTurn.session_id.in_(ids))
+            .order_by(SessionTurn.session_id, SessionTurn.seq)
+        )):
+            hot.setdefault(turn.session_id, []).append(turn)
+
+        sessions = []
+        turns = []
+        for row in rows:
+            created_at = row.created_at or datetime.utcnow()
+            day = created_at.date().isoformat()
+            keys = {"session_id": row.id, "template_id": row.template_id, "team_id": row.team_id,
+                    "user_id": row.user_id, "day": day}
+            session_turns = [
+                {"seq": turn.seq, "role": turn.role, "content": turn.content or "",
+                 "created_at": turn.created_at or created_at}
+                for turn in hot.get(row.id, [])
+            ] or [
+                {"seq": seq, "role": turn["role"], "content": turn["content"], "created_at": created_at}
+                for seq, turn in enumerate(legacy_turns(row.transcript))
+            ]
+            turns.extend({**keys, **turn} for turn in session_turns)
+            sessions.append({**keys, "turns": len(session_turns)})
+
+        turn_count = await asyncio.to_thread(store, sessions, turns)
+        await db.execute(delete(SessionTurn).where(SessionTurn.session_id.in_(ids)))
+        await db.execute(
+            update(SessionModel).where(SessionModel.id.in_(ids)).values(transcript=None, archived_at=datetime.utcnow())
+        )
+        await db.commit()
+    metrics.archived_sessions.inc(len(ids))
+    logger.info("Archived %s sessions (%s turns)", len(ids), turn_count)
+    return len(ids)
+
+
+async def archive_pending(after_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """Archive every eligible session, one batch at a time."""
+    before = datetime.utcnow() - timedelta(days=after_days)
+    total = 0
+    while True:
+        archived = await archive_batch(before)
+        total += archived
+        if archived < ARCHIVE_BATCH_SIZE:
+            return total
+
+
+async def search(query: str, **filters) -> list:
+    return await asyncio.to_thread(archive_index.search, query, **filters)
+
+
+async def get_transcript(session_id: int):
+    return await asyncio.to_thread(archive_index.transcript, session_id)
+
+
+async def user_text(session_ids: list) -> dict:
+    """Concatenated user turns of archived sessions; {} when archiving is off."""
+    if archive_index is None or not session_ids:
+        return {}
+    return await asyncio.to_thread(archive_index.user_text, session_ids)
+
+
+class TranscriptArchiver:
+    """Runs archive_pending() every ARCHIVE_INTERVAL seconds."""
+
+    def __init__(self, interval: float = ARCHIVE_INTERVAL):
+        self.interval = interval
+        self.task = None
+
+    def start(self):
+        if archive_index is not None and self.interval > 0 and self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            # Sleep first: a cold start is no time for a batch job
+            await asyncio.sleep(self.interval)
+            try:
+                await archive_pending()
+            except Exception as e:
+                logger.error("Archive pass failed: %s", str(e))
+
+
+transcript_archiver = TranscriptArchiver()
+
+
+def reindex() -> int:
+    """Rebuild index.sqlite from the Parquet files; returns the number of sessions."""
+    import pyarrow.parquet as pq
+    rebuilt = ArchiveIndex(archive_index.path + ".rebuild")
+    if os.path.exists(rebuilt.path):
+        os.remove(rebuilt.path)
+    sessions = {}
+    with closing(rebuilt.connect()) as conn:
+        for directory, _, files in os.walk(ARCHIVE_DIR):
+            for name in sorted(files):
+                if not name.endswith(".parquet"):
+                    continue
+                path = os.path.join(directory, name)
+                partition = dict(part.split("=", 1) for part in os.path.relpath(directory, ARCHIVE_DIR).split(os.sep))
+                keys = {"template_id": int(partition["template_id"]), "day": partition["day"]}
+                rows = pq.read_table(path).to_pylist()
+                # A batch retried after a crash can leave a second copy of a session; keep the first
+                elsewhere = {row["session_id"] for row in rows if row["session_id"] in sessions}
+                turns = [{**keys, **row} for row in rows if row["session_id"] not in elsewhere]
+                for turn in turns:
+                    session = sessions.setdefault(turn["session_id"], {
+                        "session_id": turn["session_id"], "template_id": keys["template_id"],
+                        "team_id": turn["team_id"], "user_id": turn["user_id"], "day": keys["day"],
+                        "turns": 0, "path": path,
+                    })
+                    session["turns"] += 1
+                with conn:
+                    rebuilt.add(conn, [], turns)
+        with conn:
+            rebuilt.add(conn, list(sessions.values()), [])
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(archive_index.path + suffix):
+            os.remove(archive_index.path + suffix)
+    os.replace(rebuilt.path, archive_index.path)
+    return len(sessions)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s", stream=sys.stdout)
+    if archive_index is None:
+        sys.exit("ARCHIVE_DIR is not set")
+    if "--reindex" in sys.argv[1:]:
+        logger.info("Re-indexed %s archived sessions", reindex())
+    else:
+        logger.info("Archived %s sessions in total", asyncio.run(archive_pending()))
@@ -0,0 +1,165 @@
+"""Client audio processing between the browser and the upstream socket.
+
+VoiceActivityDetector (enabled with LOCAL_VAD=1) classifies 20 ms PCM16
+frames by RMS energy against an adaptive noise floor. The energy of a
+whole chunk is computed in one NumPy pass. Silence between turns is held
+back, keeping only VAD_PREFIX_MS of it as lead-in for the next turn.
+When speech is followed by VAD_SILENCE_MS of silence, the turn is
+committed locally. Upstream turn detection is switched off in that mode
+(see template_cache), so commits no longer wait on remote VAD.
+
+UpstreamEncoder converts the 24 kHz PCM16 the browser sends into
+UPSTREAM_AUDIO_FORMAT. With g711_ulaw it low-pass filters, decimates to
+8 kHz and mu-law encodes, which is 1/6 of the bytes.
+"""
+import os
+from collections import deque
+import numpy as np
+import metrics
+from turns import SPEECH_TIMEOUT
+
+SAMPLE_RATE = 24000
+
+LOCAL_VAD = os.getenv("LOCAL_VAD", "0") == "1"
+VAD_FRAME_MS = 20
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "300"))
+VAD_SNR = float(os.getenv("VAD_SNR", "3.0"))
+VAD_SILENCE_MS = int(os.getenv("VAD_SILENCE_MS", "800"))
+VAD_PREFIX_MS = int(os.getenv("VAD_PREFIX_MS", "300"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+
+AUDIO_FORMATS = ("pcm16", "g711_ulaw")
+UPSTREAM_AUDIO_FORMAT = os.getenv("UPSTREAM_AUDIO_FORMAT", "pcm16")
+if UPSTREAM_AUDIO_FORMAT not in AUDIO_FORMATS:
+    raise ValueError(f"UPSTREAM_AUDIO_FORMAT must be one of {', '.join(AUDIO_FORMATS)}")
+
+# Actions returned by VoiceActivityDetector.process, in stream order
+AUDIO = "audio"
+SPEECH_STARTED = "speech_started"
+SPEECH_ENDED = "speech_ended"  # commit the turn
+SPEECH_DISCARDED = "speech_discarded"  # too short to be speech; clear the buffer
+
+# Noise floor follows quieter frames quickly and louder ones slowly
+_FLOOR_FALL = 0.2
+_FLOOR_RISE = 0.005
+
+
+class VoiceActivityDetector:
+    def __init__(self, min_rms: float = VAD_MIN_RMS, snr: float = VAD_SNR, silence_ms: int = VAD_SILENCE_MS,
+                 prefix_ms: int = VAD_PREFIX_MS, min_speech_ms: int = VAD_MIN_SPEECH_MS,
+                 max_turn_ms: int = int(SPEECH_TIMEOUT * 1000), frame_ms: int = VAD_FRAME_MS):
+        self.frame_samples = SAMPLE_RATE * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.min_rms = min_rms
+        self.snr = snr
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_turn_frames = max(1, max_turn_ms // frame_ms)
+        self.prefix = deque(maxlen=max(1, prefix_ms // frame_ms))
+        self.pending = b""
+        self.noise_floor = 0.0
+        self.speaking = False
+        self.speech_frames = 0
+        self.turn_frames = 0
+        self.silent_frames = 0
+
+    def levels(self, data: bytes) -> np.ndarray:
+        """RMS energy of every whole frame in ``data``."""
+        frames = np.frombuffer(data, dtype="<i2").reshape(-1, self.frame_samples).astype(np.float32)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def process(self, pcm: bytes) -> list:
+        """Classify a client chunk; returns ``(action, pcm)`` pairs to apply in order."""
+        data = self.pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = data[usable:]
+        if not usable:
+            return []
+        actions = []
+        voiced_run = []
+        frame_bytes = self.frame_bytes
+        for index, level in enumerate(self.levels(data[:usable]).tolist()):
+            frame = data[index * frame_bytes:(index + 1) * frame_bytes]
+            voiced = level > max(self.min_rms, self.noise_floor * self.snr)
+            rate = _FLOOR_FALL if level < self.noise_floor else _FLOOR_RISE
+            self.noise_floor += rate * (level - self.noise_floor)
+            if self.speaking:
+                voiced_run.append(frame)
+                self.turn_frames += 1
+                if voiced:
+                    self.speech_frames += 1
+                    self.silent_frames = 0
+                else:
+                    self.silent_frames += 1
+                ended = self.silent_frames >= self.silence_frames
+                if ended or self.turn_frames >= self.max_turn_frames:
+                    actions.append((AUDIO, b"".join(voiced_run)))
+                    voiced_run = []
+                    actions.append((SPEECH_ENDED if self.speech_frames >= self.min_speech_frames
+                                    else SPEECH_DISCARDED, None))
+                    # A turn that hit the length cap keeps going as a new turn
+                    self.speaking = not ended
+                    self.speech_frames = self.turn_frames = self.silent_frames = 0
+            elif voiced:
+                self.speaking = True
+                self.speech_frames = self.turn_frames = 1
+                self.silent_frames = 0
+                actions.append((SPEECH_STARTED, None))
+                voiced_run.extend(self.prefix)
+                voiced_run.append(frame)
+                self.prefix.clear()
+            else:
+                if len(self.prefix) == self.prefix.maxlen:
+                    metrics.vad_suppressed_bytes.inc(frame_bytes)
+                self.prefix.append(frame)
+        if voiced_run:
+            actions.append((AUDIO, b"".join(voiced_run)))
+        return actions
+
+
+class Downsampler:
+    """Windowed-sinc low-pass plus integer decimation, continuous across chunks."""
+
+    def __init__(self, factor: int, taps: int = 31):
+        self.factor = factor
+        offsets = np.arange(taps) - (taps - 1) / 2
+        cutoff = 0.45 / factor
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * offsets) * np.hamming(taps)
+        self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        self.phase = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        signal = np.concatenate((self.history, samples))
+        filtered = np.convolve(signal, self.kernel, mode="valid")
+        self.history = signal[len(signal) - len(self.history):]
+        out = filtered[self.phase::self.factor]
+        self.phase = (self.phase - len(samples)) % self.factor
+        return out
+
+
+def ulaw_encode(samples: np.ndarray) -> bytes:
+    """G.711 mu-law encode int16-range samples (the reference 14-bit algorithm)."""
+    pcm = np.clip(np.rint(samples), -32768, 32767).astype(np.int32) >> 2
+    negative = pcm < 0
+    pcm = np.minimum(np.where(negative, -pcm, pcm), 8159) + 33
+    segment = np.maximum(np.floor(np.log2(pcm)).astype(np.int32) - 5, 0)
+    code = np.where(segment > 7, 0x7F, (np.minimum(segment, 7) << 4) | ((pcm >> (segment + 1)) & 0x0F))
+    return (code ^ np.where(negative, 0x7F, 0xFF)).astype(np.uint8).tobytes()
+
+
+class UpstreamEncoder:
+    def __init__(self, audio_format: str = UPSTREAM_AUDIO_FORMAT):
+        self.audio_format = audio_format
+        self.downsampler = Downsampler(SAMPLE_RATE // 8000) if audio_format == "g711_ulaw" else None
+        self.pending = b""
+
+    def encode(self, pcm: bytes) -> bytes:
+        """Convert client PCM16 into the upstream input format."""
+        if self.downsampler is None:
+            return pcm
+        data = self.pending + pcm
+        usable = len(data) - len(data) % 2
+        self.pending = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32)
+        return ulaw_encode(self.downsampler.process(samples))
@@ -1,33 +1,137 @@
-from sqlalchemy.orm import Session
-from models import Template, Team, User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Template, Team, User, Session as SessionModel, SessionTurn
 from schemas import TemplateCreate, TeamCreate, UserCreate
+from database import AsyncSessionLocal
 
-def create_template(db: Session, template: TemplateCreate):
+STREAM_BATCH_SIZE = 500
+
+def list_columns(model, fields: list = None):
+    """Columns to select for a list endpoint; ``id`` is always included for the cursor."""
+    columns = model.__table__.columns
+    if not fields:
+        return list(columns)
+    unknown = [name for name in fields if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [columns["id"]] + [columns[name] for name in dict.fromkeys(fields) if name != "id"]
+
+def _list_statement(model, fields: list, after: int, filters: dict):
+    stmt = select(*list_columns(model, fields)).order_by(model.id)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    for name, value in filters.items():
+        if value is not None:
+            stmt = stmt.where(getattr(model, name) == value)
+    return stmt
+
+async def list_rows(db: AsyncSession, model, fields: list = None, after: int = None, limit: int = 100, **filters):
+    """One keyset page of plain dict rows, ordered by id."""
+    result = await db.execute(_list_statement(model, fields, after, filters).limit(limit))
+    return [dict(row._mapping) for row in result]
+
+async def stream_rows(model, fields: list = None, after: int = None, **filters):
+    """Yield every matching row in batches from a server-side cursor.
+
+    Opens its own session because it outlives the request's dependencies.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(_list_statement(model, fields, after, filters))
+        async for partition in result.partitions(STREAM_BATCH_SIZE):
+            yield [dict(row._mapping) for row in partition]
+
+async def create_template(db: AsyncSession, template: TemplateCreate):
     db_template = Template(**template.model_dump())
     db.add(db_template)
-    db.commit()
-    db.refresh(db_template)
+    await db.commit()
+    await db.refresh(db_template)
+    return db_template
+
+async def update_template(db: AsyncSession, template_id: int, template: TemplateCreate):
+    db_template = await db.get(Template, template_id)
+    if db_template is None:
+        return None
+    for key, value in template.model_dump().items():
+        setattr(db_template, key, value)
+    db_template.version = (db_template.version or 1) + 1
+    await db.commit()
+    await db.refresh(db_template)
     return db_template
 
-def get_templates(db: Session):
-    return db.query(Template).all()
+async def get_templates(db: AsyncSession, fields: list = None, after: int = None, limit: int = 100):
+    return await list_rows(db, Template, fields, after, limit)
 
-def create_team(db: Session, team: TeamCreate):
+async def create_team(db: AsyncSession, team: TeamCreate):
     db_team = Team(**team.model_dump())
     db.add(db_team)
-    db.commit()
-    db.refresh(db_team)
+    await db.commit()
+    await db.refresh(db_team)
     return db_team
 
-def get_teams(db: Session):
-    return db.query(Team).all()
+async def get_teams(db: AsyncSession, fields: list = None, after: int = None, limit: int = 100):
+    return await list_rows(db, Team, fields, after, limit)
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     db_user = User(**user.model_dump())
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_users(db: Session):
-    return db.query(User).all()
\ No newline at end of file
+async def get_users(db: AsyncSession, fields: list = None, after: int = None, limit: int = 100,
+                    team_id: int = None, role: str = None):
+    return await list_rows(db, User, fields, after, limit, team_id=team_id, role=role)
+
+async def create_session(db: AsyncSession, template_id: int, user_id: int = None):
+    team_id = None
+    if user_id is not None:
+        team_id = (await db.execute(select(User.team_id).where(User.id == user_id))).scalar()
+    db_session = SessionModel(template_id=template_id, user_id=user_id, team_id=team_id)
+    db.add(db_session)
+    await db.commit()
+    await db.refresh(db_session)
+    return db_session
+
+async def get_caller(db: AsyncSession, user_id: int):
+    """(role, team_id, team max_active_calls) for admission control, or None for an unknown user."""
+    result = await db.execute(
+        select(User.role, User.team_id, Team.max_active_calls)
+        .outerjoin(Team, Team.id == User.team_id)
+        .where(User.id == user_id)
+    )
+    return result.first()
+
+async def get_user_text(db: AsyncSession, session_ids: list) -> dict:
+    """Concatenated user turns per session, in turn order."""
+    result = await db.execute(
+        select(SessionTurn.session_id, SessionTurn.content)
+        .where(SessionTurn.session_id.in_(session_ids), SessionTurn.role == "user")
+        .order_by(SessionTurn.session_id, SessionTurn.seq)
+    )
+    texts = {}
+    for session_id, content in result:
+        texts.setdefault(session_id, []).append(content or "")
+    return {session_id: " ".join(parts) for session_id, parts in texts.items()}
+
+# What analytics.apply_feedback needs to fold a (re-)score into the rollups
+SCORING_COLUMNS = (SessionModel.id, SessionModel.template_id, SessionModel.team_id, SessionModel.created_at,
+                   SessionModel.feedback, SessionModel.score)
+
+async def get_scoring_rows(db: AsyncSession, session_ids: list):
+    """The stored outcome of ``session_ids``, locked until the caller's transaction ends."""
+    result = await db.execute(
+        select(*SCORING_COLUMNS)
+        .where(SessionModel.id.in_(session_ids))
+        .order_by(SessionModel.id)
+        .with_for_update()
+    )
+    return result.all()
+
+async def get_sessions_page(db: AsyncSession, template_id: int, after: int = 0, limit: int = 1000):
+    result = await db.execute(
+        select(SessionModel.id, SessionModel.transcript, SessionModel.archived_at)
+        .where(SessionModel.template_id == template_id, SessionModel.id > after)
+        .order_by(SessionModel.id)
+        .limit(limit)
+    )
+    return result.all()
@@ -1,19 +1,121 @@
-def calculate_feedback(transcript: list, goals: list) -> dict:
+import re
+from functools import lru_cache
+
+# Phrases that count as a booked follow-up, matched after normalization
+FOLLOW_UP_KEYWORDS = ("follow-up", "follow up", "followup", "appointment")
+
+_NON_WORD = re.compile(r"[^\w]+")
+# Romanizations of the same Hinglish word, folded to the first spelling. Only
+# whole words are folded; a generic rule (collapsing doubled letters, w->v,
+# ph->f) also merges unrelated English words like meet/method or wet/vet.
+_SPELLINGS = {
+    "bahut": ("bohot", "bahot", "bohut", "bhot", "bht"),
+    "nahi": ("nahin", "nahee", "nai", "nhi"),
+    "accha": ("acha", "achha", "achcha", "acchha"),
+    "theek": ("thik", "thheek"),
+    "haan": ("han", "haa"),
+    "kya": ("kyaa", "kia"),
+    "zaroor": ("jaroor", "zarur", "jarur"),
+    "zyada": ("jyada", "zyaada", "jyaada", "ziyada"),
+    "phir": ("fir", "phr"),
+    "wala": ("vala", "waala", "vaala"),
+    "wali": ("vali", "waali", "vaali"),
+    "wale": ("vale", "waale", "vaale"),
+    "kyun": ("kyu", "kyon", "kyoon"),
+    "kuch": ("kuchh", "kucch"),
+    "thoda": ("thora", "thodaa"),
+    "abhi": ("abi",),
+    "samajh": ("samaj", "smajh"),
+    "bhai": ("bhaai",),
+    "ji": ("jee",),
+}
+_WORD_VARIANTS = {variant: canonical for canonical, variants in _SPELLINGS.items() for variant in variants}
+
+
+def normalize(text: str) -> str:
+    """Fold case, punctuation and Hinglish spelling variants (bohot/bahut, nahin/nahi, fir/phir)."""
+    words = _NON_WORD.sub(" ", text.lower()).split()
+    return " ".join(_WORD_VARIANTS.get(word, word) for word in words)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: finds every pattern in one pass over the text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for index, pattern in enumerate(patterns):
+            if pattern:
+                self._add(pattern, index)
+        self._link()
+
+    def _add(self, pattern: str, index: int):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+                self.goto[state][char] = next_state
+            state = next_state
+        self.output[state].add(index)
+
+    def _link(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> set:
+        """Return the indexes of all patterns that occur in ``text``."""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+@lru_cache(maxsize=256)
+def _matcher(goals: tuple) -> KeywordMatcher:
+    patterns = [normalize(goal) for goal in goals] + [normalize(keyword) for keyword in FOLLOW_UP_KEYWORDS]
+    return KeywordMatcher(patterns)
+
+
+def score_text(user_text: str, goals: list) -> dict:
+    goals = tuple(goals or ())
+    found = _matcher(goals).find(normalize(user_text))
     score = 0.0
     details = {}
-    transcript_text = " ".join([entry["content"] for entry in transcript if entry["role"] == "user"]).lower()
-    
-    for goal in goals:
-        if goal.lower() in transcript_text:
+
+    for index, goal in enumerate(goals):
+        if index in found:
             score += 0.2
             details[goal] = "Achieved"
         else:
             details[goal] = "Not achieved"
-    
-    if "follow-up" in transcript_text or "appointment" in transcript_text:
+
+    if any(index >= len(goals) for index in found):
         score += 0.4
         details["Follow-up"] = "Booked"
     else:
         details["Follow-up"] = "Not booked"
-    
-    return {"score": min(score, 1.0), "details": details}
\ No newline at end of file
+
+    return {"score": min(score, 1.0), "details": details}
+
+
+def score_batch(goals: list, items: list) -> list:
+    """Score ``(session_id, user_text)`` pairs; runs inside a worker process."""
+    return [(session_id, score_text(user_text, goals)) for session_id, user_text in items]
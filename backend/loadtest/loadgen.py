@@ -0,0 +1,265 @@
+"""Drive N synthetic trainees against /stream/{template_id} and report latencies.
+
+Each trainee connects with the pcm16.v1 protocol (or legacy JSON with
+--legacy) and streams PCM in real time: --speech-ms of tone, then
+--pause-ms of silence, for --turns turns. Measured per call:
+
+- connect: time to the accepted WebSocket upgrade.
+- ttfa: time to first audio, from the end of an utterance to the first
+  audio frame of the reply.
+- relay: relay latency per audio frame, from the mock upstream's send
+  timestamp (see mock_realtime.py) to receipt. Only meaningful against
+  the mock, on the same host.
+
+With --server-pid, the relay process is sampled for CPU and RSS; the
+report gives both per connection.
+
+    python -m loadtest.loadgen --url ws://localhost:8000/stream/1 -n 50 --server-pid $(pgrep -f "uvicorn main:app")
+"""
+import os
+import sys
+import json
+import math
+import time
+import base64
+import struct
+import asyncio
+import argparse
+import aiohttp
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLE_RATE = 24000
+BYTES_PER_MS = SAMPLE_RATE * 2 // 1000
+TIMESTAMP = struct.Struct("<d")
+FRAME_AUDIO = 0x01
+FRAME_CONTROL = 0x02
+
+
+def tone(duration_ms: int, amplitude: int = 3000, frequency: int = 220) -> bytes:
+    samples = duration_ms * SAMPLE_RATE // 1000
+    return b"".join(
+        struct.pack("<h", int(amplitude * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)))
+        for i in range(samples)
+    )
+
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of the relay process (psutil, or /proc on Linux)."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.process = psutil.Process(pid) if psutil else None
+        self.rss = []
+        self.cpu_start = None
+        self.cpu_end = None
+        self.task = None
+
+    def _read(self):
+        if self.process is not None:
+            times = self.process.cpu_times()
+            return times.user + times.system, self.process.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as statm:
+            pages = int(statm.read().split()[1])
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks, pages * os.sysconf("SC_PAGE_SIZE")
+
+    async def _run(self):
+        while True:
+            self.rss.append(self._read()[1])
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.cpu_start, rss = self._read()
+        self.rss.append(rss)
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self.task.cancel()
+        self.cpu_end, rss = self._read()
+        self.rss.append(rss)
+
+
+class Trainee:
+    def __init__(self, session: aiohttp.ClientSession, url: str, args):
+        self.session = session
+        self.url = url
+        self.args = args
+        self.connect = None
+        self.ttfa = []
+        self.relay = []
+        self.audio_frames = 0
+        self.errors = []
+        self.utterance_end = None
+
+    def on_audio(self, pcm: bytes):
+        now = time.time()
+        self.audio_frames += 1
+        if len(pcm) >= TIMESTAMP.size:
+            sent = TIMESTAMP.unpack_from(pcm)[0]
+            # Real upstream audio has no timestamp; ignore anything implausible
+            if 0 <= now - sent < 60:
+                self.relay.append(now - sent)
+        if self.utterance_end is not None:
+            self.ttfa.append(time.monotonic() - self.utterance_end)
+            self.utterance_end = None
+
+    def on_control(self, message: dict):
+        if message.get("type") == "error":
+            self.errors.append(message.get("message"))
+
+    async def read(self, ws):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.BINARY and msg.data:
+                if msg.data[0] == FRAME_AUDIO:
+                    self.on_audio(msg.data[1:])
+                elif msg.data[0] == FRAME_CONTROL:
+                    self.on_control(json.loads(msg.data[1:]))
+            elif msg.type == aiohttp.WSMsgType.TEXT:
+                message = json.loads(msg.data)
+                if message.get("type") == "audio":
+                    self.on_audio(base64.b64decode(message["data"]))
+                else:
+                    self.on_control(message)
+
+    async def send(self, ws, pcm: bytes):
+        if self.args.legacy:
+            await ws.send_str(json.dumps({"type": "audio", "data": base64.b64encode(pcm).decode("ascii")}))
+        else:
+            await ws.send_bytes(bytes([FRAME_AUDIO]) + pcm)
+
+    async def stream(self, ws, audio: bytes):
+        chunk = self.args.chunk_ms * BYTES_PER_MS
+        started = time.monotonic()
+        for index, offset in enumerate(range(0, len(audio), chunk)):
+            await self.send(ws, audio[offset:offset + chunk])
+            # Real-time pacing against the start, like a microphone
+            await asyncio.sleep(max(0.0, started + (index + 1) * self.args.chunk_ms / 1000 - time.monotonic()))
+
+    async def run(self, speech: bytes, silence: bytes):
+        started = time.monotonic()
+        protocols = () if self.args.legacy else ("pcm16.v1",)
+        try:
+            async with self.session.ws_connect(self.url, protocols=protocols, max_msg_size=0) as ws:
+                self.connect = time.monotonic() - started
+                reader = asyncio.create_task(self.read(ws))
+                for _ in range(self.args.turns):
+                    await self.stream(ws, speech)
+                    self.utterance_end = time.monotonic()
+                    await self.stream(ws, silence)
+                await asyncio.sleep(self.args.linger)
+                await ws.close()
+                reader.cancel()
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+
+def summarize(trainees: list, sampler: ProcessSampler, elapsed: float) -> dict:
+    def stats(values, scale=1000.0):
+        values = [value * scale for value in values]
+        return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                "p99": percentile(values, 99), "max": max(values) if values else None}
+
+    connected = [trainee for trainee in trainees if trainee.connect is not None]
+    report = {
+        "connections": len(trainees),
+        "connected": len(connected),
+        "failed": sum(1 for trainee in trainees if trainee.errors),
+        "elapsed_s": round(elapsed, 2),
+        "audio_frames": sum(trainee.audio_frames for trainee in trainees),
+        "connect_ms": stats([trainee.connect for trainee in connected]),
+        "ttfa_ms": stats([value for trainee in trainees for value in trainee.ttfa]),
+        "relay_ms": stats([value for trainee in trainees for value in trainee.relay]),
+        "errors": sorted({error for trainee in trainees for error in trainee.errors})[:10],
+    }
+    if sampler is not None and connected:
+        cpu_seconds = sampler.cpu_end - sampler.cpu_start
+        baseline, peak = sampler.rss[0], max(sampler.rss)
+        report["server"] = {
+            "cpu_percent": round(100 * cpu_seconds / elapsed, 1),
+            "cpu_ms_per_connection": round(1000 * cpu_seconds / len(connected), 1),
+            "rss_baseline_mb": round(baseline / 2 ** 20, 1),
+            "rss_peak_mb": round(peak / 2 ** 20, 1),
+            "rss_kb_per_connection": round((peak - baseline) / 1024 / len(connected), 1),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"connections {report['connected']}/{report['connections']} connected, "
+          f"{report['failed']} with errors, {report['elapsed_s']}s, {report['audio_frames']} audio frames")
+    for name in ("connect_ms", "ttfa_ms", "relay_ms"):
+        values = report[name]
+        cells = "  ".join(
+            f"{key} {values[key]:8.1f}" if values[key] is not None else f"{key}      n/a"
+            for key in ("p50", "p95", "p99", "max")
+        )
+        print(f"{name:<11} n={values['count']:<7} {cells}")
+    server = report.get("server")
+    if server:
+        print(f"server      cpu {server['cpu_percent']}% ({server['cpu_ms_per_connection']} ms/conn), "
+              f"rss {server['rss_baseline_mb']} -> {server['rss_peak_mb']} MB "
+              f"({server['rss_kb_per_connection']} KB/conn)")
+    for error in report["errors"]:
+        print(f"error: {error}")
+
+
+async def run(args) -> dict:
+    speech = tone(args.speech_ms)
+    silence = b"\x00" * (args.pause_ms * BYTES_PER_MS)
+    sampler = ProcessSampler(args.server_pid) if args.server_pid else None
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        trainees = [Trainee(session, args.url, args) for _ in range(args.connections)]
+        if sampler:
+            sampler.start()
+        started = time.monotonic()
+        tasks = []
+        for trainee in trainees:
+            tasks.append(asyncio.create_task(trainee.run(speech, silence)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.connections)
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+        if sampler:
+            sampler.stop()
+    return summarize(trainees, sampler, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8000/stream/1")
+    parser.add_argument("-n", "--connections", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which connections are opened")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--speech-ms", type=int, default=1500)
+    parser.add_argument("--pause-ms", type=int, default=4000, help="silence after each utterance (reply window)")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="audio per client frame")
+    parser.add_argument("--linger", type=float, default=1.0, help="seconds to wait after the last turn")
+    parser.add_argument("--legacy", action="store_true", help="use the JSON/base64 protocol")
+    parser.add_argument("--server-pid", type=int, help="relay process to sample for CPU and RSS")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(report, out, indent=2)
+    sys.exit(1 if report["connected"] < report["connections"] else 0)
+
+
+if __name__ == "__main__":
+    main()
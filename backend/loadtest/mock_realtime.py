@@ -0,0 +1,220 @@
+"""Local stand-in for the OpenAI Realtime API, for load tests.
+
+Speaks the subset of the protocol the relay uses: session.update,
+input_audio_buffer.* (with a simple energy VAD), a transcription of each
+committed item, response.create and response.cancel,
+response.created/audio.delta/done, and 429 errors.
+--drop-rate closes sockets mid-call to exercise the relay's reconnects.
+A session.update with turn_detection null disables the mock VAD, so turns
+are only committed by the relay (LOCAL_VAD=1).
+
+Every response.audio.delta starts with the send time as a little-endian
+double in place of the first four samples. loadgen.py reads it back to
+measure relay latency.
+
+    python -m loadtest.mock_realtime --port 9000 --latency 0.3
+    OPENAI_REALTIME_URL=ws://localhost:9000/v1/realtime uvicorn main:app
+"""
+import json
+import time
+import array
+import base64
+import random
+import struct
+import asyncio
+import argparse
+import logging
+from aiohttp import web
+
+SAMPLE_RATE = 24000
+BYTES_PER_MS = SAMPLE_RATE * 2 // 1000
+TIMESTAMP = struct.Struct("<d")
+
+
+class MockSettings:
+    def __init__(self, latency: float = 0.3, response_ms: int = 2000, delta_ms: int = 100,
+                 output_rate: float = 1.0, vad_threshold: int = 500, silence_ms: int = 500,
+                 error_rate: float = 0.0, drop_rate: float = 0.0):
+        self.latency = latency
+        self.response_ms = response_ms
+        self.delta_ms = delta_ms
+        self.output_rate = output_rate
+        self.vad_threshold = vad_threshold
+        self.silence_ms = silence_ms
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+
+
+def is_speech(pcm: bytes, threshold: int) -> bool:
+    samples = array.array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    # Every 8th sample is plenty for a synthetic tone vs. silence
+    return any(abs(sample) > threshold for sample in samples[::8])
+
+
+def audio_delta(pcm_tail: bytes) -> str:
+    payload = base64.b64encode(TIMESTAMP.pack(time.time()) + pcm_tail).decode("ascii")
+    return '{"type":"response.audio.delta","delta":"' + payload + '"}'
+
+
+class MockConnection:
+    def __init__(self, ws: web.WebSocketResponse, settings: MockSettings, stats: dict):
+        self.ws = ws
+        self.settings = settings
+        self.stats = stats
+        self.server_vad = True
+        self.speaking = False
+        self.silence_ms = 0.0
+        self.heard_ms = 0.0
+        self.response = None
+        self.items = 0
+
+    async def send(self, event: dict):
+        await self.ws.send_str(json.dumps(event))
+
+    async def commit(self, transcript: str):
+        """Commit the input buffer as a user item, then deliver its transcription."""
+        self.items += 1
+        item_id = f"item_mock_{self.items}"
+        await self.send({"type": "input_audio_buffer.committed", "item_id": item_id})
+        await self.send({"type": "conversation.item.input_audio_transcription.completed",
+                         "item_id": item_id, "content_index": 0, "transcript": transcript})
+
+    async def on_append(self, pcm: bytes):
+        self.stats["appends"] += 1
+        settings = self.settings
+        if settings.drop_rate and random.random() < settings.drop_rate:
+            self.stats["dropped"] += 1
+            await self.ws.close(code=1011, message=b"mock drop")
+            return
+        if settings.error_rate and random.random() < settings.error_rate:
+            self.stats["rate_limited"] += 1
+            await self.send({"type": "error", "error": {
+                "type": "requests", "code": "rate_limit_exceeded", "message": "429: Rate limit reached"}})
+            return
+        if not self.server_vad:
+            return
+        duration = len(pcm) / BYTES_PER_MS
+        if is_speech(pcm, settings.vad_threshold):
+            if not self.speaking:
+                self.speaking = True
+                self.heard_ms = 0.0
+                await self.send({"type": "input_audio_buffer.speech_started"})
+            self.silence_ms = 0.0
+            self.heard_ms += duration
+        elif self.speaking:
+            self.silence_ms += duration
+            if self.silence_ms >= settings.silence_ms:
+                self.speaking = False
+                await self.send({"type": "input_audio_buffer.speech_stopped"})
+                await self.commit(f"mock utterance of {int(self.heard_ms)} ms")
+
+    async def on_response_create(self):
+        if self.response is not None and not self.response.done():
+            await self.send({"type": "error", "error": {
+                "type": "invalid_request_error", "message": "Conversation already has an active response"}})
+            return
+        self.response = asyncio.create_task(self.respond())
+
+    async def respond(self):
+        settings = self.settings
+        status = "completed"
+        try:
+            await asyncio.sleep(settings.latency)
+            await self.send({"type": "response.created"})
+            filler = b"\x10\x00" * (settings.delta_ms * BYTES_PER_MS // 2 - 4)
+            interval = settings.delta_ms / 1000 / settings.output_rate if settings.output_rate > 0 else 0
+            started = time.monotonic()
+            for index in range(max(1, settings.response_ms // settings.delta_ms)):
+                await self.ws.send_str(audio_delta(filler))
+                self.stats["deltas"] += 1
+                if interval:
+                    # Pace against the start time so send jitter does not accumulate
+                    await asyncio.sleep(max(0.0, started + (index + 1) * interval - time.monotonic()))
+        except asyncio.CancelledError:
+            status = "cancelled"
+        self.stats["responses"] += 1
+        if not self.ws.closed:
+            try:
+                await self.send({"type": "response.done", "response": {
+                    "status": status, "output": [{"content": [{"type": "audio", "transcript": "mock reply"}]}]}})
+            except ConnectionResetError:
+                pass
+
+    async def run(self):
+        await self.send({"type": "session.created"})
+        try:
+            async for msg in self.ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                event = json.loads(msg.data)
+                kind = event.get("type")
+                if kind == "input_audio_buffer.append":
+                    await self.on_append(base64.b64decode(event["audio"]))
+                elif kind == "session.update":
+                    session = event.get("session", {})
+                    # turn_detection: null means the client commits turns itself
+                    self.server_vad = session.get("turn_detection", {}) is not None
+                    await self.send({"type": "session.updated", "session": session})
+                elif kind == "input_audio_buffer.commit":
+                    self.speaking = False
+                    await self.commit("mock utterance")
+                elif kind == "input_audio_buffer.clear":
+                    self.speaking = False
+                    await self.send({"type": "input_audio_buffer.cleared"})
+                elif kind == "response.create":
+                    await self.on_response_create()
+                elif kind == "response.cancel" and self.response is not None:
+                    self.response.cancel()
+                elif kind == "conversation.item.create":
+                    self.stats["replayed_items"] += 1
+                    await self.send({"type": "conversation.item.created", "item": event.get("item", {})})
+        finally:
+            if self.response is not None:
+                self.response.cancel()
+
+
+def make_app(settings: MockSettings = None) -> web.Application:
+    settings = settings or MockSettings()
+    stats = {"connections": 0, "appends": 0, "deltas": 0, "responses": 0, "rate_limited": 0,
+             "dropped": 0, "replayed_items": 0}
+
+    async def realtime(request):
+        ws = web.WebSocketResponse(heartbeat=None, max_msg_size=0)
+        await ws.prepare(request)
+        stats["connections"] += 1
+        await MockConnection(ws, settings, stats).run()
+        return ws
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_get("/v1/realtime", realtime)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds from response.create to response.created")
+    parser.add_argument("--response-ms", type=int, default=2000, help="audio per response")
+    parser.add_argument("--delta-ms", type=int, default=100, help="audio per response.audio.delta")
+    parser.add_argument("--output-rate", type=float, default=1.0,
+                        help="playback speed of responses, 1.0 = real time, 0 = as fast as possible")
+    parser.add_argument("--vad-threshold", type=int, default=500)
+    parser.add_argument("--silence-ms", type=int, default=500, help="silence that ends a speech turn")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 429 per append")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability of closing the socket per append")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    settings = MockSettings(args.latency, args.response_ms, args.delta_ms, args.output_rate,
+                            args.vad_threshold, args.silence_ms, args.error_rate, args.drop_rate)
+    web.run_app(make_app(settings), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
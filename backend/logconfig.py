@@ -0,0 +1,151 @@
+"""Non-blocking, structured logging for the backend.
+
+Records are tagged with the current connection/session id and handed to a
+background QueueListener thread, which formats them as JSON lines and writes
+them to LOG_FILE. The relay path only pays for a context lookup, a sampling
+check and a queue put.
+
+Hot-path call sites pass ``extra={"event": "<type>"}``; each event type is
+limited to LOG_SAMPLE_PER_SECOND records per second, with the number of
+suppressed records reported on the next one that gets through. Audio
+payload fields are redacted and long strings truncated unless LOG_PAYLOADS
+is set.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar
+
+LOG_FILE = os.getenv("LOG_FILE", "chatbot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_PER_SECOND = int(os.getenv("LOG_SAMPLE_PER_SECOND", "5"))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "1000"))
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "").lower() in ("1", "true", "yes")
+
+PAYLOAD_KEYS = {"delta", "audio", "data"}
+
+connection_id = ContextVar("connection_id", default="-")
+session_id = ContextVar("session_id", default=None)
+
+_listener = None
+
+
+def truncate(text: str, limit: int = LOG_MAX_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text) - limit} more chars)"
+
+
+def redact(value):
+    """Strip audio payloads and shorten long strings inside logged objects."""
+    if isinstance(value, dict):
+        return {
+            key: (f"<{len(item)} chars redacted>" if key in PAYLOAD_KEYS and isinstance(item, str) and not LOG_PAYLOADS
+                  else redact(item))
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return truncate(value)
+    return value
+
+
+class ContextFilter(logging.Filter):
+    """Copy the connection/session context onto the record before it leaves this thread."""
+
+    def filter(self, record):
+        record.conn = connection_id.get()
+        record.session = session_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Rate-limit records per ``event`` type; untagged records always pass."""
+
+    def __init__(self, per_second: int = LOG_SAMPLE_PER_SECOND):
+        super().__init__()
+        self.per_second = per_second
+        self.windows = {}
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        now = int(time.monotonic())
+        window, count, suppressed = self.windows.get(event, (now, 0, 0))
+        if window != now:
+            window, count = now, 0
+        if count >= self.per_second:
+            self.windows[event] = (window, count, suppressed + 1)
+            return False
+        record.suppressed = suppressed
+        self.windows[event] = (window, count + 1, 0)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        try:
+            args = redact(record.args) if record.args else None
+            if isinstance(args, list):
+                args = tuple(args)
+            message = record.msg % args if args else str(record.msg)
+        except Exception:
+            message = record.getMessage()
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "conn": getattr(record, "conn", "-"),
+            "session": getattr(record, "session", None),
+            "msg": truncate(message),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry["event"] = event
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _InlineQueueHandler(logging.handlers.QueueHandler):
+    # The listener runs in this process, so skip QueueHandler's eager
+    # message formatting and leave it to the background thread.
+    def prepare(self, record):
+        return record
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    handler = _InlineQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,64 @@
+"""Prometheus metrics, served as text at GET /metrics.
+
+The websocket handler, the turn scheduler, the rate controller and the DB
+pool record into the collectors below. Values are per worker process, so
+with several uvicorn workers each one has to be scraped.
+
+Hot paths use label children bound once here instead of calling
+``.labels()`` per message.
+"""
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+CLIENT_TO_UPSTREAM = "client_to_upstream"
+UPSTREAM_TO_CLIENT = "upstream_to_client"
+
+# 1 ms .. 10 s; relay hops sit at the low end, turn latencies at the high end
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+active_connections = Gauge("relay_active_connections", "Open /stream client connections")
+upstream_connect_seconds = Histogram(
+    "relay_upstream_connect_seconds", "Time to a configured upstream realtime socket",
+    ["warm"], buckets=LATENCY_BUCKETS,
+)
+first_audio_seconds = Histogram(
+    "relay_committed_to_first_audio_seconds",
+    "From input_audio_buffer.committed to the first response.audio.delta of the reply",
+    buckets=LATENCY_BUCKETS,
+)
+relay_latency_seconds = Histogram(
+    "relay_latency_seconds", "Time an audio chunk spends inside the relay", ["direction"], buckets=LATENCY_BUCKETS,
+)
+relay_bytes = Counter("relay_audio_bytes", "Audio bytes relayed, upstream-bound in the upstream input format",
+                      ["direction"])
+vad_suppressed_bytes = Counter("relay_vad_suppressed_bytes", "Client silence held back by the local VAD")
+audio_dropped = Counter("relay_audio_dropped_chunks", "Client audio chunks dropped by a full relay queue")
+upstream_reconnects = Counter("relay_upstream_reconnects", "Upstream socket replacements after a drop", ["result"])
+scheduler_queue_depth = Gauge(
+    "relay_scheduler_queue_depth", "Committed turns waiting for response.create, across connections",
+)
+upstream_rate_limited = Counter(
+    "relay_upstream_rate_limited", "Upstream 429s, including exhausted rate_limits.updated events",
+)
+upstream_rate = Gauge("relay_upstream_rate_per_second", "Current AIMD pace for upstream audio sends")
+db_pool_checkout_seconds = Histogram(
+    "db_pool_checkout_seconds", "Wait for a pooled database connection (including connects)",
+    buckets=LATENCY_BUCKETS,
+)
+admission_queue_depth = Gauge("admission_queue_depth", "Calls waiting for an admission slot")
+admission_wait_seconds = Histogram("admission_wait_seconds", "Queue time of calls that got a slot",
+                                   buckets=LATENCY_BUCKETS + (30.0, 60.0, 120.0))
+admission_rejected = Counter("admission_rejected", "Calls refused by admission control", ["reason"])
+archived_sessions = Counter("archive_sessions", "Sessions moved to the transcript archive")
+startup_seconds = Gauge("app_startup_seconds", "Cold start of this worker: importing main, then lifespan startup",
+                        ["phase"])
+db_pool_checked_out = Gauge("db_pool_checked_out", "Database connections currently checked out")
+
+client_to_upstream_latency = relay_latency_seconds.labels(CLIENT_TO_UPSTREAM)
+upstream_to_client_latency = relay_latency_seconds.labels(UPSTREAM_TO_CLIENT)
+client_to_upstream_bytes = relay_bytes.labels(CLIENT_TO_UPSTREAM)
+upstream_to_client_bytes = relay_bytes.labels(UPSTREAM_TO_CLIENT)
+
+
+def render():
+    """Return (body, content type) for the /metrics response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,82 @@
+"""One-shot schema setup, run before the app serves (and never by it).
+
+    python migrate.py
+
+Creates missing tables and indexes from models.py. Columns added to a model
+since the table was created are added with ALTER TABLE ... ADD COLUMN as
+nullable columns, and indexes added to it are created. Running it again is a no-op. In docker-compose it runs as
+the ``migrate`` service, which the backend waits on.
+"""
+import sys
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import inspect, text  # noqa: E402
+from sqlalchemy.schema import CreateColumn  # noqa: E402
+from database import Base, get_engine, dispose_engine  # noqa: E402
+import models  # noqa: E402,F401  (registers the tables on Base.metadata)
+
+logger = logging.getLogger("migrate")
+
+
+def add_missing_columns(conn) -> list:
+    """ADD COLUMN for model columns an existing table does not have yet."""
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            # Existing rows have no value for it, whatever the model says
+            column.nullable = True
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def add_missing_indexes(conn) -> list:
+    """CREATE INDEX for model indexes an existing table does not have yet."""
+    inspector = inspect(conn)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                added.append(index.name)
+    return added
+
+
+def migrate(conn) -> list:
+    added = add_missing_columns(conn) + add_missing_indexes(conn)
+    Base.metadata.create_all(conn)
+    return added
+
+
+async def main():
+    started = time.perf_counter()
+    try:
+        async with get_engine().begin() as conn:
+            added = await conn.run_sync(migrate)
+    finally:
+        await dispose_engine()
+    for name in added:
+        logger.info("Added %s", name)
+    logger.info("Schema is up to date (%d tables) in %.2fs",
+                len(Base.metadata.tables), time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s", stream=sys.stdout)
+    asyncio.run(main())
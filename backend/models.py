@@ -1,8 +1,6 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, JSON, DateTime, Date, Float, Boolean, Index, UniqueConstraint, text
 from datetime import datetime
-
-Base = declarative_base()
+from database import Base
 
 class Template(Base):
     __tablename__ = "templates"
@@ -18,8 +16,79 @@ class Session(Base):
     __tablename__ = "sessions"
     id = Column(Integer, primary_key=True, index=True)
     template_id = Column(Integer)
+    user_id = Column(Integer, nullable=True, index=True)
+    team_id = Column(Integer, nullable=True)  # copied from the user when the call starts
     transcript = Column(JSON)
     feedback = Column(JSON)
+    # Normalized from feedback; NULL until the session has been counted in the rollups
+    score = Column(Float, nullable=True)
+    follow_up_booked = Column(Boolean, nullable=True)
+    audio_path = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Set once the turns live in the archive (see archive.py) and transcript is NULL
+    archived_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_sessions_template_id_created_at", "template_id", "created_at"),
+        Index("ix_sessions_team_id_created_at", "team_id", "created_at"),
+        # Sessions still waiting to be archived
+        Index("ix_sessions_unarchived_created_at", "created_at",
+              postgresql_where=text("archived_at IS NULL"), sqlite_where=text("archived_at IS NULL")),
+    )
+
+class SessionGoalOutcome(Base):
+    __tablename__ = "session_goal_outcomes"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, index=True)
+    template_id = Column(Integer)
+    team_id = Column(Integer, nullable=True)
+    goal = Column(String)
+    achieved = Column(Boolean)
+    created_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_session_goal_outcomes_template_id_created_at", "template_id", "created_at"),
+    )
+
+class DailyRollup(Base):
+    """Per day, template and team totals; team_id 0 collects unattributed sessions."""
+    __tablename__ = "daily_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date)
+    template_id = Column(Integer)
+    team_id = Column(Integer)
+    sessions = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+    follow_ups = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "template_id", "team_id", name="uq_daily_rollups_key"),
+        Index("ix_daily_rollups_template_id_day", "template_id", "day"),
+        Index("ix_daily_rollups_team_id_day", "team_id", "day"),
+    )
+
+class DailyGoalRollup(Base):
+    __tablename__ = "daily_goal_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date)
+    template_id = Column(Integer)
+    team_id = Column(Integer)
+    goal = Column(String)
+    achieved = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)  # scored sessions that had this goal
+
+    __table_args__ = (
+        UniqueConstraint("day", "template_id", "team_id", "goal", name="uq_daily_goal_rollups_key"),
+        Index("ix_daily_goal_rollups_template_id_day", "template_id", "day"),
+    )
+
+class SessionTurn(Base):
+    __tablename__ = "session_turns"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, index=True)
+    seq = Column(Integer)
+    role = Column(String)  # user, assistant
+    content = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Team(Base):
@@ -27,10 +96,17 @@ class Team(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     members = Column(JSON)
+    max_active_calls = Column(Integer, nullable=True)  # overrides TEAM_MAX_ACTIVE_CALLS
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     role = Column(String)  # admin, manager, sales_rep
-    team_id = Column(Integer)
\ No newline at end of file
+    team_id = Column(Integer)
+
+    __table_args__ = (
+        # Keyset pagination within a team / role: WHERE team_id = ? AND id > ? ORDER BY id
+        Index("ix_users_team_id_id", "team_id", "id"),
+        Index("ix_users_role_id", "role", "id"),
+    )
\ No newline at end of file
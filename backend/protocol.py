@@ -0,0 +1,108 @@
+"""Wire format for /stream/{template_id}.
+
+Clients that offer the ``pcm16.v1`` WebSocket sub-protocol exchange binary
+frames with a one-byte type header:
+
+    0x01 AUDIO    raw PCM16 little-endian mono 24 kHz samples
+    0x02 CONTROL  UTF-8 JSON control message (interrupt, log, text, error, ...)
+
+Clients that do not offer the sub-protocol keep the original JSON text
+messages with base64 audio, so older frontends continue to work.
+"""
+import base64
+import json
+from fastapi import WebSocket, WebSocketDisconnect
+
+SUBPROTOCOL = "pcm16.v1"
+
+FRAME_AUDIO = 0x01
+FRAME_CONTROL = 0x02
+
+_AUDIO_HEADER = bytes([FRAME_AUDIO])
+_CONTROL_HEADER = bytes([FRAME_CONTROL])
+
+# Sent as-is after locally detected turns (see audio.VoiceActivityDetector)
+UPSTREAM_COMMIT = '{"type":"input_audio_buffer.commit"}'
+UPSTREAM_CLEAR = '{"type":"input_audio_buffer.clear"}'
+
+# Upstream audio events are compact JSON with "type" first; anything else
+# falls back to json.loads in the caller.
+_AUDIO_DELTA_MARKER = '"type":"response.audio.delta"'
+_DELTA_KEY = '"delta":"'
+
+
+def upstream_audio_append(pcm: bytes) -> str:
+    """Build an input_audio_buffer.append event without a dict/json.dumps round-trip."""
+    return '{"type":"input_audio_buffer.append","audio":"' + base64.b64encode(pcm).decode("ascii") + '"}'
+
+
+def decoded_size(b64: str) -> int:
+    """Byte length of a base64 payload without decoding it."""
+    return len(b64) * 3 // 4 - b64.count("=", -2)
+
+
+def extract_audio_delta(raw: str):
+    """Return the base64 payload of a response.audio.delta event, or None.
+
+    Only the fast path is handled here; None means the caller should parse
+    the message normally.
+    """
+    if _AUDIO_DELTA_MARKER not in raw[:64]:
+        return None
+    start = raw.find(_DELTA_KEY)
+    if start == -1:
+        return None
+    start += len(_DELTA_KEY)
+    end = raw.find('"', start)
+    if end == -1:
+        return None
+    delta = raw[start:end]
+    if "\\" in delta:
+        return None
+    return delta
+
+
+class ClientChannel:
+    """One browser connection, speaking either the binary or the legacy JSON protocol."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.binary = SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+
+    async def accept(self):
+        await self.websocket.accept(subprotocol=SUBPROTOCOL if self.binary else None)
+
+    async def receive(self):
+        """Return ("audio", PCM16 bytes) or ("control", dict) for the next client message."""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        frame = message.get("bytes")
+        if frame is not None:
+            if not frame:
+                return "control", {"type": "noop"}
+            if frame[0] == FRAME_AUDIO:
+                return "audio", frame[1:]
+            if frame[0] == FRAME_CONTROL:
+                return "control", json.loads(frame[1:])
+            raise ValueError(f"Unknown frame type: {frame[0]}")
+        data = json.loads(message["text"])
+        if data.get("type") == "audio":
+            return "audio", base64.b64decode(data["data"])
+        return "control", data
+
+    async def send_audio(self, delta_b64: str, pcm: bytes = None):
+        """Forward an upstream base64 audio delta to the client.
+
+        ``pcm`` may carry the already-decoded samples so they are not decoded twice.
+        """
+        if self.binary:
+            await self.websocket.send_bytes(_AUDIO_HEADER + (pcm if pcm is not None else base64.b64decode(delta_b64)))
+        else:
+            await self.websocket.send_text('{"type":"audio","data":"' + delta_b64 + '"}')
+
+    async def send_control(self, message: dict):
+        if self.binary:
+            await self.websocket.send_bytes(_CONTROL_HEADER + json.dumps(message).encode("utf-8"))
+        else:
+            await self.websocket.send_json(message)
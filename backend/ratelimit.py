@@ -0,0 +1,187 @@
+"""Upstream rate limiting and client->upstream backpressure.
+
+UpstreamRateController is shared by every connection in the process. It
+paces upstream audio sends with a token bucket whose rate follows AIMD:
+a 429 halves the rate (and pauses sends briefly), and every
+RATE_RECOVERY_SECONDS without an error adds RATE_INCREASE_STEP back, up to
+RATE_MAX_PER_SECOND. One upstream limit is usually reported to many calls
+at once, so the rate is cut at most once per RATE_RECOVERY_SECONDS; further
+429s in that window only extend the pause.
+
+AudioRelayQueue sits between a client socket and its upstream socket. It
+holds at most AUDIO_QUEUE_MAX_CHUNKS chunks, dropping the oldest when full,
+and hands the sender everything queued (up to AUDIO_BATCH_MAX_BYTES) as one
+coalesced chunk, so a slow upstream never stalls the client reader.
+Pre-serialized upstream messages (local VAD commits) queue in order with
+the audio and are never dropped.
+"""
+import os
+import asyncio
+import logging
+from collections import deque
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_MAX_PER_SECOND = float(os.getenv("RATE_MAX_PER_SECOND", "500"))
+RATE_MIN_PER_SECOND = float(os.getenv("RATE_MIN_PER_SECOND", "10"))
+RATE_DECREASE_FACTOR = float(os.getenv("RATE_DECREASE_FACTOR", "0.5"))
+RATE_INCREASE_STEP = float(os.getenv("RATE_INCREASE_STEP", "25"))
+RATE_RECOVERY_SECONDS = float(os.getenv("RATE_RECOVERY_SECONDS", "5"))
+RATE_LIMIT_COOLDOWN = float(os.getenv("RATE_LIMIT_COOLDOWN", "1"))
+
+AUDIO_QUEUE_MAX_CHUNKS = int(os.getenv("AUDIO_QUEUE_MAX_CHUNKS", "16"))
+AUDIO_BATCH_MAX_BYTES = int(os.getenv("AUDIO_BATCH_MAX_BYTES", str(256 * 1024)))
+
+
+class UpstreamRateController:
+    def __init__(self, max_rate: float = RATE_MAX_PER_SECOND, min_rate: float = RATE_MIN_PER_SECOND,
+                 decrease_factor: float = RATE_DECREASE_FACTOR, increase_step: float = RATE_INCREASE_STEP,
+                 recovery_seconds: float = RATE_RECOVERY_SECONDS, cooldown: float = RATE_LIMIT_COOLDOWN):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.recovery_seconds = recovery_seconds
+        self.cooldown = cooldown
+        self.rate = max_rate
+        self.tokens = max_rate
+        self.updated = None
+        self.last_change = 0.0
+        self.last_decrease = None
+        self.paused_until = 0.0
+        self.rate_limited_total = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _refill(self, now: float):
+        if self.updated is None:
+            self.updated = now
+        # Additive increase for every quiet recovery period since the last change
+        if self.rate < self.max_rate:
+            periods = int((now - self.last_change) / self.recovery_seconds)
+            if periods > 0:
+                self.rate = min(self.max_rate, self.rate + periods * self.increase_step)
+                self.last_change += periods * self.recovery_seconds
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until one upstream send is allowed."""
+        while True:
+            now = self._now()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_rate_limited(self, retry_after: float = None):
+        """Multiplicative decrease after an upstream 429, at most once per recovery period."""
+        now = self._now()
+        self._refill(now)
+        self.rate_limited_total += 1
+        metrics.upstream_rate_limited.inc()
+        repeated = now < self.paused_until or (
+            self.last_decrease is not None and now - self.last_decrease < self.recovery_seconds)
+        if repeated:
+            # Same limit event, already seen by another call
+            if retry_after is not None:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            logger.debug("Upstream rate limited again, keeping %.1f msg/s", self.rate,
+                         extra={"event": "rate_limited"})
+            return
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.tokens = min(self.tokens, self.rate)
+        self.last_change = now
+        self.last_decrease = now
+        self.paused_until = max(self.paused_until, now + (retry_after if retry_after is not None else self.cooldown))
+        logger.warning("Upstream rate limited, pacing audio at %.1f msg/s", self.rate)
+
+    def observe_rate_limits(self, limits: list):
+        """Feed a rate_limits.updated event; an exhausted limit counts as a 429 (damped the same way)."""
+        for limit in limits or []:
+            if limit.get("remaining") == 0:
+                self.on_rate_limited(limit.get("reset_seconds"))
+                return
+
+
+def is_rate_limit_error(event: dict) -> bool:
+    error = event.get("error") or {}
+    return "429" in str(error.get("message", "")) or error.get("code") == "rate_limit_exceeded"
+
+
+class AudioRelayQueue:
+    def __init__(self, max_chunks: int = AUDIO_QUEUE_MAX_CHUNKS, max_batch_bytes: int = AUDIO_BATCH_MAX_BYTES):
+        self.chunks = deque()
+        self.times = deque()
+        self.max_chunks = max_chunks
+        self.max_batch_bytes = max_batch_bytes
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+        self.loop = asyncio.get_running_loop()
+        # Enqueue time of the oldest chunk in the last batch handed out by get()
+        self.batch_queued_at = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def put(self, pcm: bytes):
+        if len(self.chunks) >= self.max_chunks:
+            self._drop_oldest_audio()
+        self.chunks.append(pcm)
+        self.times.append(self.loop.time())
+        self.ready.set()
+
+    def put_message(self, message: str):
+        """Queue an upstream event to be sent after the audio already queued."""
+        self.chunks.append(message)
+        self.times.append(self.loop.time())
+        self.ready.set()
+
+    def _drop_oldest_audio(self):
+        for index, item in enumerate(self.chunks):
+            if isinstance(item, bytes):
+                del self.chunks[index]
+                del self.times[index]
+                break
+        else:
+            return
+        self.dropped += 1
+        metrics.audio_dropped.inc()
+        if self.dropped == 1 or self.dropped % 50 == 0:
+            logger.warning("Audio relay queue full, dropped %s chunks so far", self.dropped)
+
+    async def get(self):
+        """Return the queued audio coalesced into one chunk, or a queued message (str).
+
+        Returns None once the queue is closed and empty.
+        """
+        while not self.chunks:
+            if self.closed:
+                return None
+            self.ready.clear()
+            await self.ready.wait()
+        batch = [self.chunks.popleft()]
+        self.batch_queued_at = self.times.popleft()
+        if isinstance(batch[0], str):
+            return batch[0]
+        size = len(batch[0])
+        while self.chunks and isinstance(self.chunks[0], bytes) and size + len(self.chunks[0]) <= self.max_batch_bytes:
+            size += len(self.chunks[0])
+            batch.append(self.chunks.popleft())
+            self.times.popleft()
+        return batch[0] if len(batch) == 1 else b"".join(batch)
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+
+rate_controller = UpstreamRateController()
+metrics.upstream_rate.set_function(lambda: rate_controller.rate)
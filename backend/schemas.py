@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class TemplateCreate(BaseModel):
     title: str
@@ -11,6 +11,7 @@ class TemplateCreate(BaseModel):
 class TeamCreate(BaseModel):
     name: str
     members: List[int]
+    max_active_calls: Optional[int] = None
 
 class UserCreate(BaseModel):
     name: str
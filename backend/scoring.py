@@ -0,0 +1,182 @@
+"""Background feedback scoring.
+
+The stream handler only enqueues a finished session. FeedbackPipeline
+consumers flush its transcript turns, score them in a process pool and
+write the result (and its analytics rollups), so socket teardown never
+waits on scoring. On shutdown the queue is drained for up to
+FEEDBACK_DRAIN_SECONDS; sessions still unscored after that are logged.
+
+Re-scoring walks a template's sessions in keyset batches of
+RESCORE_BATCH_SIZE. Each batch is split into chunks of RESCORE_CHUNK_SIZE
+that are scored in parallel across the workers and written back with one
+bulk UPDATE plus the rollup deltas. Archived sessions are re-scored from
+the archive index. Job records live in the memory of the worker that
+started the job.
+"""
+import os
+import uuid
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from database import AsyncSessionLocal
+from models import Template
+from crud import get_user_text, get_sessions_page
+from analytics import apply_feedback
+from feedback import score_batch
+from transcript import transcript_writer
+import archive
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_WORKERS = int(os.getenv("FEEDBACK_WORKERS", "2"))
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "2000"))
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "250"))
+RESCORE_JOBS_KEPT = 100
+# Shutdown waits this long for queued sessions to be scored
+FEEDBACK_DRAIN_SECONDS = float(os.getenv("FEEDBACK_DRAIN_SECONDS", "5"))
+
+
+def legacy_user_text(transcript) -> str:
+    """User text from a pre-session_turns Session.transcript (a JSON-encoded list)."""
+    return " ".join(turn["content"] for turn in archive.legacy_turns(transcript) if turn["role"] == "user")
+
+
+class FeedbackPipeline:
+    def __init__(self, workers: int = FEEDBACK_WORKERS):
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue()
+        self.executor = None
+        self.consumers = []
+        self.in_flight = set()
+        self.jobs = OrderedDict()
+        self.running = {}  # template id -> its running re-score job
+        self.tasks = set()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self):
+        if self.executor is None:
+            self.executor = self._new_executor()
+            self.consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = FEEDBACK_DRAIN_SECONDS):
+        """Score what is already queued (for up to ``timeout`` seconds), then stop."""
+        if self.consumers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pending = sorted(self.in_flight)
+                while not self.queue.empty():
+                    pending.append(self.queue.get_nowait()[0])
+                    self.queue.task_done()
+                # Their score stays NULL; POST /templates/{id}/rescore picks them up
+                logger.warning("Stopped with %s sessions unscored: %s", len(pending), pending)
+        # Running re-scores are cancelled; they can be started again after the restart
+        for task in [*self.consumers, *self.tasks]:
+            task.cancel()
+        await asyncio.gather(*self.consumers, *self.tasks, return_exceptions=True)
+        self.consumers = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def submit(self, session_id: int, goals: list, audio_path: str = None):
+        """Queue a finished session for scoring; returns immediately."""
+        self.queue.put_nowait((session_id, goals, audio_path))
+
+    async def _score(self, goals: list, items: list) -> list:
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, score_batch, goals, items)
+        except BrokenProcessPool:
+            # A dead worker process breaks the whole pool; replace it once and retry
+            if self.executor is executor:
+                logger.warning("Feedback worker pool broke, starting a new one")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+            return await loop.run_in_executor(self.executor, score_batch, goals, items)
+
+    async def _consume(self):
+        while True:
+            session_id, goals, audio_path = await self.queue.get()
+            self.in_flight.add(session_id)
+            try:
+                await transcript_writer.flush()
+                async with AsyncSessionLocal() as db:
+                    user_text = (await get_user_text(db, [session_id])).get(session_id, "")
+                [(_, feedback)] = await self._score(goals, [(session_id, user_text)])
+                async with AsyncSessionLocal() as db:
+                    await apply_feedback(db, {session_id: feedback}, {session_id: {"audio_path": audio_path}})
+            except Exception as e:
+                logger.error("Failed to score session %s: %s", session_id, str(e))
+            finally:
+                self.in_flight.discard(session_id)
+                self.queue.task_done()
+
+    def rescore_template(self, template_id: int) -> dict:
+        """Start re-scoring every stored session of a template; returns the job record.
+
+        A template has at most one running job; asking again returns that job.
+        """
+        if template_id in self.running:
+            return self.running[template_id]
+        job = {"id": uuid.uuid4().hex[:12], "template_id": template_id, "status": "running", "scored": 0}
+        self.jobs[job["id"]] = job
+        self.running[template_id] = job
+        while len(self.jobs) > RESCORE_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+        task = asyncio.create_task(self._rescore(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return job
+
+    async def _rescore(self, job: dict):
+        try:
+            async with AsyncSessionLocal() as db:
+                template = await db.get(Template, job["template_id"])
+                goals = list(template.goals or []) if template else []
+            after = 0
+            while True:
+                async with AsyncSessionLocal() as db:
+                    page = await get_sessions_page(db, job["template_id"], after, RESCORE_BATCH_SIZE)
+                    if not page:
+                        break
+                    texts = await get_user_text(db, [row.id for row in page])
+                texts.update(await archive.user_text([row.id for row in page if row.id not in texts]))
+                sessions = page
+                if archive.archive_index is None:
+                    # Archived text lives on the archive host; keep these sessions' old scores
+                    sessions = [row for row in page if row.archived_at is None]
+                if len(sessions) < len(page):
+                    job["skipped"] = job.get("skipped", 0) + len(page) - len(sessions)
+                items = [(row.id, texts.get(row.id) or legacy_user_text(row.transcript)) for row in sessions]
+                chunks = [items[i:i + RESCORE_CHUNK_SIZE] for i in range(0, len(items), RESCORE_CHUNK_SIZE)]
+                results = await asyncio.gather(*(self._score(goals, chunk) for chunk in chunks))
+                async with AsyncSessionLocal() as db:
+                    await apply_feedback(
+                        db, {session_id: feedback for chunk in results for session_id, feedback in chunk}
+                    )
+                after = page[-1].id
+                job["scored"] += len(items)
+            job["status"] = "done"
+            logger.info("Re-scored %s sessions for template %s", job["scored"], job["template_id"])
+            if job.get("skipped"):
+                logger.warning("Skipped %s archived sessions of template %s: no archive index on this host",
+                               job["skipped"], job["template_id"])
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            logger.error("Re-score of template %s failed: %s", job["template_id"], str(e))
+        finally:
+            self.running.pop(job["template_id"], None)
+
+
+feedback_pipeline = FeedbackPipeline()
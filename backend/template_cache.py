@@ -0,0 +1,117 @@
+"""In-process cache of rendered templates.
+
+Each entry holds the rendered system prompt and the pre-serialized
+session.update message for one template version, so a connect only costs a
+single-column version lookup. Entries are evicted LRU beyond
+TEMPLATE_CACHE_SIZE, dropped explicitly when a template is updated in this
+process, and replaced whenever the stored version differs (updates made
+by other workers).
+"""
+import os
+import json
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Template
+from audio import LOCAL_VAD, UPSTREAM_AUDIO_FORMAT
+
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "128"))
+
+# System prompt for Hinglish
+SYSTEM_PROMPT = """
+You are {persona_name}, a {job_title} with a {demeanor} demeanor, speaking casual Hinglish popular among younger urban users. Respond in a natural mix of Hindi and English, adapting to the user's language and maintaining a friendly, engaging tone. The call context is: {call_context}. Focus on these goals: {goals}. Handle these objections: {objections}. Example: User: "Yeh product kitna reliable hai?" Assistant: "Bohot reliable hai, bhai! One-year warranty ke saath top-notch performance." If you don't understand the input, respond with: "Sorry, thoda clearly bol sakte ho?" Keep responses concise for low latency.
+"""
+
+
+def render_prompt(template: Template) -> str:
+    persona = template.persona or {}
+    return SYSTEM_PROMPT.format(
+        persona_name=persona.get("name", "Sales Assistant"),
+        job_title=persona.get("job_title", "Sales Representative"),
+        demeanor=persona.get("demeanor", "friendly"),
+        call_context=template.call_context,
+        goals=", ".join(template.goals or []),
+        objections=", ".join(template.objections or [])
+    )
+
+
+def build_session_update(prompt: str) -> dict:
+    session_update = {
+        "type": "session.update",
+        "session": {
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.1,
+                "prefix_padding_ms": 300,
+                "silence_duration_ms": 1200,
+                "create_response": True,
+                "interrupt_response": True
+            },
+            "input_audio_transcription": {
+                "model": "whisper-1",
+                "language": "hi"
+            },
+            "voice": "alloy",
+            "instructions": prompt,
+            "modalities": ["text", "audio"]
+        }
+    }
+    if LOCAL_VAD:
+        # Turns are committed by the relay's own VAD
+        session_update["session"]["turn_detection"] = None
+    if UPSTREAM_AUDIO_FORMAT != "pcm16":
+        session_update["session"]["input_audio_format"] = UPSTREAM_AUDIO_FORMAT
+    return session_update
+
+
+class CachedTemplate:
+    __slots__ = ("id", "version", "goals", "prompt", "session_update")
+
+    def __init__(self, template: Template):
+        self.id = template.id
+        self.version = template.version
+        self.goals = list(template.goals or [])
+        self.prompt = render_prompt(template)
+        # Serialized once; sent verbatim on every connect
+        self.session_update = json.dumps(build_session_update(self.prompt))
+
+    @property
+    def key(self):
+        """Identifies this exact rendering, e.g. for the warm realtime pool."""
+        return (self.id, self.version)
+
+
+class TemplateCache:
+    def __init__(self, max_size: int = TEMPLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    async def get(self, db: AsyncSession, template_id: int):
+        """Return the CachedTemplate for ``template_id``, or None if it does not exist."""
+        version = (await db.execute(select(Template.version).where(Template.id == template_id))).first()
+        if version is None:
+            self.invalidate(template_id)
+            return None
+        entry = self.entries.get(template_id)
+        if entry is not None and entry.version == version[0]:
+            self.entries.move_to_end(template_id)
+            return entry
+        template = await db.get(Template, template_id, populate_existing=True)
+        if template is None:
+            self.invalidate(template_id)
+            return None
+        return self.put(template)
+
+    def put(self, template: Template) -> CachedTemplate:
+        entry = CachedTemplate(template)
+        self.entries[template.id] = entry
+        self.entries.move_to_end(template.id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, template_id: int):
+        self.entries.pop(template_id, None)
+
+
+template_cache = TemplateCache()
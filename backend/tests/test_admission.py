@@ -0,0 +1,19 @@
+import asyncio
+from admission import AdmissionController
+
+
+def test_calls_without_a_team_share_the_team_cap():
+    async def scenario():
+        ac = AdmissionController(max_active=0, team_max_active=2, queue_size=10, queue_timeout=1)
+        slots = [ac.try_acquire(None), ac.try_acquire(None)]
+        third = ac.try_acquire(None)
+        other_team = ac.try_acquire(7)
+        status = ac.status()
+        slots[0].release()
+        return slots, third, other_team, status, ac.try_acquire(None)
+
+    slots, third, other_team, status, after_release = asyncio.run(scenario())
+    assert all(slots) and third is None
+    assert other_team is not None
+    assert status["teams"] == {"none": 2, "7": 1}
+    assert after_release is not None
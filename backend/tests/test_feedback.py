@@ -0,0 +1,38 @@
+from feedback import normalize, KeywordMatcher, score_text
+
+
+def test_normalize_folds_case_and_punctuation():
+    assert normalize("  Follow-Up, please!! ") == "follow up please"
+
+
+def test_normalize_folds_hinglish_spellings():
+    assert normalize("bohot") == normalize("bahut")
+    assert normalize("Nahin, acha") == normalize("nahi accha")
+    assert normalize("phir") == normalize("fir")
+    assert normalize("wala") == normalize("vala")
+    assert normalize("jyada") == normalize("zyada")
+
+
+def test_normalize_keeps_doubled_letters():
+    assert normalize("meet") != normalize("met")
+    assert normalize("free") != normalize("fre")
+
+
+def test_keyword_matcher_finds_overlapping_patterns():
+    matcher = KeywordMatcher(["he", "she", "his", "hers", ""])
+    assert matcher.find("ushers") == {0, 1, 3}
+    assert matcher.find("this") == {2}
+    assert matcher.find("xyz") == set()
+
+
+def test_score_text_has_no_folding_false_positives():
+    assert score_text("what is the frequency", ["free"])["details"]["free"] == "Not achieved"
+    assert score_text("use this method", ["meet"])["details"]["meet"] == "Not achieved"
+    assert score_text("the floor is wet", ["vet"])["details"]["vet"] == "Not achieved"
+    assert score_text("we vary plans", ["wary"])["details"]["wary"] == "Not achieved"
+
+
+def test_score_text_matches_variants_and_follow_up():
+    result = score_text("Bohot acha, followup kal karte hain", ["bahut accha", "discount"])
+    assert result["details"] == {"bahut accha": "Achieved", "discount": "Not achieved", "Follow-up": "Booked"}
+    assert round(result["score"], 2) == 0.6
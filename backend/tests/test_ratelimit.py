@@ -0,0 +1,42 @@
+import asyncio
+from ratelimit import UpstreamRateController
+
+
+def controller():
+    return UpstreamRateController(max_rate=500, min_rate=10, decrease_factor=0.5, increase_step=25,
+                                  recovery_seconds=5, cooldown=1)
+
+
+def test_burst_of_429s_halves_once():
+    async def scenario():
+        rc = controller()
+        for _ in range(50):
+            rc.on_rate_limited()
+        return rc
+
+    rc = asyncio.run(scenario())
+    assert rc.rate == 250
+    assert rc.rate_limited_total == 50
+
+
+def test_429_after_window_halves_again():
+    async def scenario():
+        rc = controller()
+        rc.on_rate_limited()
+        loop_time = asyncio.get_running_loop().time
+        rc._now = lambda: loop_time() + 6
+        rc.on_rate_limited()
+        return rc
+
+    # One recovery period (+25) passed before the second 429
+    assert asyncio.run(scenario()).rate == 137.5
+
+
+def test_exhausted_rate_limits_are_damped():
+    async def scenario():
+        rc = controller()
+        for _ in range(10):
+            rc.observe_rate_limits([{"name": "requests", "remaining": 0, "reset_seconds": 0.5}])
+        return rc
+
+    assert asyncio.run(scenario()).rate == 250
@@ -0,0 +1,34 @@
+import asyncio
+from aiohttp.test_utils import TestServer
+import upstream
+from upstream import RealtimePool
+from loadtest.mock_realtime import make_app
+
+SESSION_UPDATE = '{"type": "session.update", "session": {}}'
+
+
+def test_idle_socket_stays_warm_past_heartbeat(monkeypatch):
+    monkeypatch.setattr(upstream, "UPSTREAM_HEARTBEAT", 0.2)
+
+    async def scenario():
+        async with TestServer(make_app()) as server:
+            monkeypatch.setattr(upstream, "OPENAI_REALTIME_URL", str(server.make_url("/v1/realtime")))
+            pool = RealtimePool(size=1, idle_seconds=60)
+            try:
+                first, warm = await pool.acquire("t1", SESSION_UPDATE)
+                assert not warm
+                await first.close()
+                while not pool.idle.get("t1"):
+                    await asyncio.sleep(0.05)
+                # Unread, the socket would be closed with ServerTimeoutError after 1.5 heartbeats
+                await asyncio.sleep(1.0)
+                ws, warm = await pool.acquire("t1", SESSION_UPDATE)
+                assert warm
+                assert not ws.closed and ws.exception() is None
+                await ws.close()
+            finally:
+                await pool.close()
+                await upstream.close_http_session()
+            assert not pool.tasks
+
+    asyncio.run(scenario())
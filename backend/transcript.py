@@ -0,0 +1,159 @@
+"""Incremental session persistence.
+
+Text turns are queued by the stream handler and written in batches to
+``session_turns`` by one background task per process, so a call never keeps
+its transcript in memory. Assistant audio can optionally be spooled to a
+per-session WAV file under ``AUDIO_SPOOL_DIR``.
+"""
+import os
+import asyncio
+import logging
+import wave
+from datetime import datetime
+from sqlalchemy import insert
+from database import AsyncSessionLocal
+from models import SessionTurn
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_BATCH_SIZE = int(os.getenv("TRANSCRIPT_BATCH_SIZE", "50"))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", "0.5"))
+
+# Unset disables audio spooling
+AUDIO_SPOOL_DIR = os.getenv("AUDIO_SPOOL_DIR")
+AUDIO_SPOOL_FLUSH_BYTES = int(os.getenv("AUDIO_SPOOL_FLUSH_BYTES", str(256 * 1024)))
+AUDIO_SAMPLE_RATE = 24000
+
+
+class TranscriptWriter:
+    """Batches text turns from every live call into bulk inserts."""
+
+    def __init__(self, batch_size: int = TRANSCRIPT_BATCH_SIZE, flush_interval: float = TRANSCRIPT_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.sequences = {}
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            await self.flush()
+            self.task.cancel()
+            self.task = None
+
+    def append(self, session_id: int, role: str, content: str):
+        seq = self.sequences.get(session_id, 0)
+        self.sequences[session_id] = seq + 1
+        self.queue.put_nowait({
+            "session_id": session_id,
+            "seq": seq,
+            "role": role,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        })
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        if self.task is None:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(done)
+        await done
+
+    def forget(self, session_id: int):
+        self.sequences.pop(session_id, None)
+
+    async def _run(self):
+        while True:
+            batch = []
+            waiters = []
+            item = await self.queue.get()
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while True:
+                if isinstance(item, asyncio.Future):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._write(batch)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _write(self, batch: list):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(SessionTurn), batch)
+                await db.commit()
+        except Exception as e:
+            logger.error("Failed to write %s transcript turns: %s", len(batch), str(e))
+
+
+transcript_writer = TranscriptWriter()
+
+
+class AudioSpool:
+    """Append-only WAV file for one session's assistant audio.
+
+    Writes are buffered and handed to a worker thread in order, so the relay
+    loop never waits on disk.
+    """
+
+    def __init__(self, path: str, wav):
+        self.path = path
+        self.wav = wav
+        self.buffer = bytearray()
+        self.pending = None
+
+    @classmethod
+    async def open(cls, session_id: int):
+        if not AUDIO_SPOOL_DIR:
+            return None
+        path = os.path.join(AUDIO_SPOOL_DIR, f"session_{session_id}.wav")
+
+        def _open():
+            os.makedirs(AUDIO_SPOOL_DIR, exist_ok=True)
+            wav = wave.open(path, "wb")
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(AUDIO_SAMPLE_RATE)
+            return wav
+
+        return cls(path, await asyncio.to_thread(_open))
+
+    def write(self, pcm: bytes):
+        self.buffer += pcm
+        if len(self.buffer) >= AUDIO_SPOOL_FLUSH_BYTES:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        self.pending = asyncio.create_task(self._flush(self.pending, data))
+
+    async def _flush(self, previous, data: bytes):
+        if previous is not None:
+            await previous
+        await asyncio.to_thread(self.wav.writeframesraw, data)
+
+    async def close(self):
+        if self.buffer:
+            self._schedule_flush()
+        try:
+            if self.pending is not None:
+                await self.pending
+        finally:
+            await asyncio.to_thread(self.wav.close)
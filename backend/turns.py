@@ -0,0 +1,153 @@
+"""Per-connection turn state for the realtime relay.
+
+TurnScheduler is driven by upstream events instead of polling. Timers are
+armed only while something is due: a response.create held back by
+RESPONSE_DELAY, or a speech turn that may need a forced commit after
+SPEECH_TIMEOUT. An idle connection costs no wakeups.
+"""
+import os
+import asyncio
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_DELAY = float(os.getenv("RESPONSE_DELAY", "1.0"))
+SPEECH_TIMEOUT = float(os.getenv("SPEECH_TIMEOUT", "5"))
+RESPONSE_CREATE_ATTEMPTS = 3
+
+
+class TurnScheduler:
+    def __init__(self, send, response_delay: float = RESPONSE_DELAY, speech_timeout: float = SPEECH_TIMEOUT):
+        """``send`` is a coroutine function that delivers one event dict upstream."""
+        self.send = send
+        self.response_delay = response_delay
+        self.speech_timeout = speech_timeout
+        self.loop = asyncio.get_running_loop()
+        self.pending = 0
+        self.active = False
+        self.requested = False
+        self.last_response_end = 0.0
+        self.dispatch_timer = None
+        self.speech_timer = None
+        self.tasks = set()
+        self.closed = False
+
+    @property
+    def has_active_response(self) -> bool:
+        return self.active
+
+    @property
+    def queue_depth(self) -> int:
+        return self.pending
+
+    # Upstream events
+
+    def on_speech_started(self):
+        self._cancel_speech_timer()
+        if not self.closed:
+            self.speech_timer = self.loop.call_later(self.speech_timeout, self._force_commit)
+
+    def on_speech_stopped(self):
+        self._cancel_speech_timer()
+
+    def on_committed(self):
+        self._cancel_speech_timer()
+        self.pending += 1
+        metrics.scheduler_queue_depth.inc()
+        logger.info("Added response.create request to queue")
+        self._maybe_dispatch()
+
+    def on_response_created(self):
+        self.active = True
+        self.requested = False
+
+    def on_response_done(self):
+        self.active = False
+        self.requested = False
+        self.last_response_end = self.loop.time()
+        self._maybe_dispatch()
+
+    def on_error(self):
+        """An upstream error may have rejected our response.create; allow the next one."""
+        self.requested = False
+        self._maybe_dispatch()
+
+    def on_upstream_reset(self):
+        """The upstream session was replaced; nothing queued or in flight there survives."""
+        self._cancel_speech_timer()
+        if self.dispatch_timer is not None:
+            self.dispatch_timer.cancel()
+            self.dispatch_timer = None
+        for task in self.tasks:
+            task.cancel()
+        metrics.scheduler_queue_depth.dec(self.pending)
+        self.pending = 0
+        self.active = False
+        self.requested = False
+
+    def close(self):
+        if not self.closed:
+            metrics.scheduler_queue_depth.dec(self.pending)
+        self.closed = True
+        self._cancel_speech_timer()
+        if self.dispatch_timer is not None:
+            self.dispatch_timer.cancel()
+            self.dispatch_timer = None
+        for task in self.tasks:
+            task.cancel()
+
+    # Internals
+
+    def _maybe_dispatch(self):
+        if self.closed or self.active or self.requested or not self.pending or self.dispatch_timer is not None:
+            return
+        wait = self.last_response_end + self.response_delay - self.loop.time()
+        if wait > 0:
+            self.dispatch_timer = self.loop.call_later(wait, self._dispatch_due)
+            return
+        self.pending -= 1
+        metrics.scheduler_queue_depth.dec()
+        self.requested = True
+        self._spawn(self._send_response_create())
+
+    def _dispatch_due(self):
+        self.dispatch_timer = None
+        self._maybe_dispatch()
+
+    async def _send_response_create(self):
+        for attempt in range(RESPONSE_CREATE_ATTEMPTS):
+            try:
+                await self.send({
+                    "type": "response.create",
+                    "response": {"modalities": ["text", "audio"]}
+                })
+                logger.info("Sent response.create from queue")
+                return
+            except Exception as e:
+                logger.error(f"Failed to send response.create (attempt {attempt + 1}): {str(e)}")
+                if self.closed:
+                    return
+                await asyncio.sleep(0.5 * (2 ** attempt))
+        self.requested = False
+
+    def _force_commit(self):
+        self.speech_timer = None
+        self._spawn(self._send_commit())
+
+    async def _send_commit(self):
+        try:
+            await self.send({"type": "input_audio_buffer.commit"})
+            logger.info("Forced speech turn commit due to timeout")
+        except Exception as e:
+            logger.error("Failed to force speech commit: %s", str(e))
+
+    def _cancel_speech_timer(self):
+        if self.speech_timer is not None:
+            self.speech_timer.cancel()
+            self.speech_timer = None
+
+    def _spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
@@ -0,0 +1,229 @@
+"""Connections to the OpenAI Realtime API.
+
+One aiohttp ClientSession (with its own connector and DNS cache) lives for
+the whole application. On top of it, RealtimePool can keep a few upstream
+sockets per template already connected and configured with session.update,
+so a new trainee skips the TLS handshake and WebSocket upgrade.
+
+When a call's upstream socket drops, resume_realtime() opens a fresh one,
+re-sends the cached session.update and replays the recent conversation as
+conversation.item.create events. Callers retry it with reconnect_delay(),
+an exponential backoff with full jitter, so calls that dropped together
+do not reconnect in lockstep.
+"""
+import os
+import json
+import random
+import asyncio
+import logging
+from collections import deque
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Point at loadtest/mock_realtime.py (e.g. ws://localhost:9000/v1/realtime) for load tests
+OPENAI_REALTIME_URL = os.getenv(
+    "OPENAI_REALTIME_URL", "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview"
+)
+
+UPSTREAM_CONNECTION_LIMIT = int(os.getenv("UPSTREAM_CONNECTION_LIMIT", "0"))  # 0 = unlimited
+UPSTREAM_DNS_CACHE_TTL = int(os.getenv("UPSTREAM_DNS_CACHE_TTL", "300"))
+UPSTREAM_HEARTBEAT = float(os.getenv("UPSTREAM_HEARTBEAT", "20"))
+
+UPSTREAM_RECONNECT_ATTEMPTS = int(os.getenv("UPSTREAM_RECONNECT_ATTEMPTS", "5"))
+UPSTREAM_RECONNECT_BASE = float(os.getenv("UPSTREAM_RECONNECT_BASE", "0.25"))
+UPSTREAM_RECONNECT_MAX = float(os.getenv("UPSTREAM_RECONNECT_MAX", "4"))
+
+# Warm pool: sockets kept per template, 0 disables pooling
+REALTIME_POOL_SIZE = int(os.getenv("REALTIME_POOL_SIZE", "0"))
+REALTIME_POOL_IDLE_SECONDS = float(os.getenv("REALTIME_POOL_IDLE_SECONDS", "120"))
+
+_http_session = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=UPSTREAM_CONNECTION_LIMIT,
+            ttl_dns_cache=UPSTREAM_DNS_CACHE_TTL,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector)
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def connect_realtime(session_update: str) -> aiohttp.ClientWebSocketResponse:
+    """Open an upstream realtime socket and send the pre-serialized session.update."""
+    headers = {
+        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+        "openai-beta": "realtime=v1"
+    }
+    ws = await get_http_session().ws_connect(OPENAI_REALTIME_URL, headers=headers, heartbeat=UPSTREAM_HEARTBEAT)
+    try:
+        await ws.send_str(session_update)
+    except Exception:
+        await ws.close()
+        raise
+    return ws
+
+
+def reconnect_delay(attempt: int) -> float:
+    return random.uniform(0, min(UPSTREAM_RECONNECT_MAX, UPSTREAM_RECONNECT_BASE * 2 ** attempt))
+
+
+def conversation_item(role: str, text: str) -> str:
+    content_type = "input_text" if role == "user" else "text"
+    return json.dumps({
+        "type": "conversation.item.create",
+        "item": {"type": "message", "role": role, "content": [{"type": content_type, "text": text}]}
+    })
+
+
+async def resume_realtime(session_update: str, history) -> aiohttp.ClientWebSocketResponse:
+    """Open a replacement socket for a call and replay its ``{"role", "content"}`` history."""
+    ws = await connect_realtime(session_update)
+    try:
+        for turn in history:
+            await ws.send_str(conversation_item(turn["role"], turn["content"]))
+    except Exception:
+        await ws.close()
+        raise
+    return ws
+
+
+class RealtimePool:
+    """Pre-connected upstream sockets, keyed by template and version.
+
+    A key becomes warm the first time it is acquired and stays warm until it
+    goes unused for ``idle_seconds``. Idle sockets older than that are closed
+    by the reaper; closed sockets are discarded on checkout.
+
+    aiohttp only handles heartbeat pongs inside receive(), so every idle
+    socket has a reader task until checkout. It also consumes
+    session.created/session.updated and drops the socket on an error event.
+    """
+
+    def __init__(self, size: int = REALTIME_POOL_SIZE, idle_seconds: float = REALTIME_POOL_IDLE_SECONDS):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.idle = {}
+        self.configs = {}
+        self.last_used = {}
+        self.refilling = set()
+        self.tasks = set()
+        self.reaper = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        if self.enabled and self.reaper is None:
+            self.reaper = asyncio.create_task(self._reap())
+
+    async def close(self):
+        if self.reaper is not None:
+            self.reaper.cancel()
+            self.reaper = None
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for sockets in self.idle.values():
+            while sockets:
+                ws, _, _ = await self._checkout(sockets.popleft())
+                await ws.close()
+        self.idle.clear()
+        self.configs.clear()
+
+    async def acquire(self, key, session_update: str):
+        """Return (socket, warm) for a template, preferring a pooled socket."""
+        if not self.enabled:
+            return await connect_realtime(session_update), False
+        now = asyncio.get_running_loop().time()
+        self.configs[key] = session_update
+        self.last_used[key] = now
+        sockets = self.idle.get(key)
+        ws = None
+        while sockets:
+            candidate, created, _ = await self._checkout(sockets.popleft())
+            if self._healthy(candidate, created, now):
+                ws = candidate
+                break
+            await candidate.close()
+        self._schedule_refill(key)
+        if ws is not None:
+            return ws, True
+        return await connect_realtime(session_update), False
+
+    def _healthy(self, ws, created: float, now: float) -> bool:
+        return not ws.closed and ws.exception() is None and now - created < self.idle_seconds
+
+    async def _checkout(self, entry):
+        """Stop an idle socket's reader; unread messages stay queued on the socket."""
+        reader = entry[2]
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        return entry
+
+    async def _keep_alive(self, key, ws):
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            event = json.loads(msg.data)
+            if event.get("type") == "error":
+                logger.warning("Pre-warmed realtime socket for %s got an error: %s", key, event.get("error"))
+                await ws.close()
+                return
+
+    def _schedule_refill(self, key):
+        if key not in self.refilling:
+            self.refilling.add(key)
+            task = asyncio.create_task(self._refill(key))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _refill(self, key):
+        try:
+            while key in self.configs and len(self.idle.setdefault(key, deque())) < self.size:
+                ws = await connect_realtime(self.configs[key])
+                if key not in self.configs:
+                    # Went cold while we were connecting
+                    await ws.close()
+                    break
+                reader = asyncio.create_task(self._keep_alive(key, ws))
+                self.idle.setdefault(key, deque()).append((ws, asyncio.get_running_loop().time(), reader))
+        except Exception as e:
+            logger.error("Failed to pre-warm realtime socket for %s: %s", key, str(e))
+        finally:
+            self.refilling.discard(key)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(self.idle_seconds / 2)
+            now = asyncio.get_running_loop().time()
+            for key in list(self.idle):
+                sockets = self.idle[key]
+                cold = now - self.last_used.get(key, 0) > self.idle_seconds
+                if cold:
+                    self.configs.pop(key, None)
+                    self.last_used.pop(key, None)
+                    del self.idle[key]
+                # Picked before the first await, so a concurrent acquire() sees a consistent deque
+                stale = [entry for entry in sockets if cold or not self._healthy(entry[0], entry[1], now)]
+                for entry in stale:
+                    sockets.remove(entry)
+                for entry in stale:
+                    ws, _, _ = await self._checkout(entry)
+                    await ws.close()
+                if not cold and len(sockets) < self.size:
+                    self._schedule_refill(key)
+
+
+realtime_pool = RealtimePool()
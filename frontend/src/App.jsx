@@ -7,6 +7,18 @@ import ChatInterface from './components/ChatInterface';
 import axios from 'axios';
 import './App.css';
 
+// List endpoints return one page at a time; X-Next-Cursor names the next one
+const fetchAll = async (url) => {
+    const rows = [];
+    let after = null;
+    do {
+        const response = await axios.get(url, { params: after ? { after } : {} });
+        rows.push(...response.data);
+        after = response.headers['x-next-cursor'];
+    } while (after);
+    return rows;
+};
+
 const App = () => {
     const [templates, setTemplates] = useState([]);
     const [teams, setTeams] = useState([]);
@@ -15,19 +27,37 @@ const App = () => {
     const [showTemplateForm, setShowTemplateForm] = useState(false);
     const [showTeamManagement, setShowTeamManagement] = useState(false);
     const [showFeedback, setShowFeedback] = useState(false);
+    // Who is practicing; sessions are attributed to this user's team
+    const [currentUserId, setCurrentUserId] = useState(() => localStorage.getItem('currentUserId') || '');
+
+    // MANAGER_TOKEN, for queue priority when the backend requires it
+    const [managerToken, setManagerToken] = useState(() => localStorage.getItem('managerToken') || '');
+
+    const handleCurrentUserChange = (e) => {
+        setCurrentUserId(e.target.value);
+        localStorage.setItem('currentUserId', e.target.value);
+    };
+
+    const handleManagerTokenChange = (e) => {
+        setManagerToken(e.target.value);
+        localStorage.setItem('managerToken', e.target.value);
+    };
+
+    const currentUser = users.find(user => String(user.id) === currentUserId);
+    const isManager = ['admin', 'manager'].includes(currentUser?.role);
 
     useEffect(() => {
         // Fetch templates, teams, and users
         const fetchData = async () => {
             try {
-                const [templatesRes, teamsRes, usersRes] = await Promise.all([
-                    axios.get('http://localhost:8000/templates'),
-                    axios.get('http://localhost:8000/teams'),
-                    axios.get('http://localhost:8000/users')
+                const [templatesData, teamsData, usersData] = await Promise.all([
+                    fetchAll('http://localhost:8000/templates'),
+                    fetchAll('http://localhost:8000/teams'),
+                    fetchAll('http://localhost:8000/users')
                 ]);
-                setTemplates(templatesRes.data);
-                setTeams(teamsRes.data);
-                setUsers(usersRes.data);
+                setTemplates(templatesData);
+                setTeams(teamsData);
+                setUsers(usersData);
             } catch (error) {
                 console.error('Error fetching data:', error);
             }
@@ -105,6 +135,29 @@ const App = () => {
                 <FeedbackReport templates={templates} onClose={() => setShowFeedback(false)} />
             )}
 
+            <div className="flex justify-center items-center space-x-2 mb-6">
+                <label className="text-sm font-medium">Practicing as</label>
+                <select
+                    value={currentUserId}
+                    onChange={handleCurrentUserChange}
+                    className="p-2 border rounded"
+                >
+                    <option value="">Guest (not counted for a team)</option>
+                    {users.map(user => (
+                        <option key={user.id} value={user.id}>{user.name} ({user.role})</option>
+                    ))}
+                </select>
+                {isManager && (
+                    <input
+                        type="password"
+                        value={managerToken}
+                        onChange={handleManagerTokenChange}
+                        placeholder="Manager key (for queue priority)"
+                        className="p-2 border rounded"
+                    />
+                )}
+            </div>
+
             <div className="grid grid-cols-1 md:grid-cols-2 gap-4 mb-6">
                 {templates.map(template => (
                     <RoleplayCard
@@ -116,7 +169,12 @@ const App = () => {
             </div>
 
             {selectedTemplate && (
-                <ChatInterface templateId={selectedTemplate.id} onClose={() => setSelectedTemplate(null)} />
+                <ChatInterface
+                    templateId={selectedTemplate.id}
+                    userId={currentUserId}
+                    managerToken={isManager ? managerToken : ''}
+                    onClose={() => setSelectedTemplate(null)}
+                />
             )}
         </div>
     );
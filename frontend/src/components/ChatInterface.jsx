@@ -1,7 +1,21 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { WavRecorder, WavStreamPlayer } from '../wavtools';
 
-const ChatInterface = ({ templateId, onClose }) => {
+// Binary sub-protocol shared with backend/protocol.py: one-byte type header, then payload
+const SUBPROTOCOL = 'pcm16.v1';
+const FRAME_AUDIO = 0x01;
+const FRAME_CONTROL = 0x02;
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+const encodeFrame = (kind, payload) => {
+    const frame = new Uint8Array(payload.byteLength + 1);
+    frame[0] = kind;
+    frame.set(payload, 1);
+    return frame.buffer;
+};
+
+const ChatInterface = ({ templateId, userId, managerToken, onClose }) => {
     const [messages, setMessages] = useState([]);
     const [isRecording, setIsRecording] = useState(false);
     const [isSpeaking, setIsSpeaking] = useState(false);
@@ -23,9 +37,45 @@ const ChatInterface = ({ templateId, onClose }) => {
         if (toUI) {
             setLogs(prev => [...prev, `[${timestamp}] ${message}`]);
         }
-        if (websocket.current?.readyState === WebSocket.OPEN) {
-            websocket.current.send(JSON.stringify({ type: 'log', message: `[Frontend ${timestamp}] ${message}` }));
+        sendControl({ type: 'log', message: `[Frontend ${timestamp}] ${message}` });
+    };
+
+    const sendControl = (message) => {
+        if (websocket.current?.readyState !== WebSocket.OPEN) return false;
+        if (websocket.current.protocol === SUBPROTOCOL) {
+            websocket.current.send(encodeFrame(FRAME_CONTROL, textEncoder.encode(JSON.stringify(message))));
+        } else {
+            websocket.current.send(JSON.stringify(message));
+        }
+        return true;
+    };
+
+    const sendAudio = (pcm16) => {
+        if (websocket.current?.readyState !== WebSocket.OPEN) return false;
+        const bytes = new Uint8Array(pcm16.buffer, pcm16.byteOffset, pcm16.byteLength);
+        if (websocket.current.protocol === SUBPROTOCOL) {
+            websocket.current.send(encodeFrame(FRAME_AUDIO, bytes));
+        } else {
+            websocket.current.send(JSON.stringify({ type: 'audio', data: btoa(String.fromCharCode.apply(null, bytes)) }));
+        }
+        return true;
+    };
+
+    const decodeMessage = (raw) => {
+        if (typeof raw === 'string') {
+            const data = JSON.parse(raw);
+            if (data.type === 'audio') {
+                const audioData = new Uint8Array(atob(data.data).split('').map(c => c.charCodeAt(0)));
+                return { type: 'audio', pcm16: new Int16Array(audioData.buffer) };
+            }
+            return data;
         }
+        const frame = new Uint8Array(raw);
+        if (frame[0] === FRAME_AUDIO) {
+            // slice() copies into a fresh, 2-byte aligned buffer
+            return { type: 'audio', pcm16: new Int16Array(raw.slice(1)) };
+        }
+        return JSON.parse(textDecoder.decode(frame.subarray(1)));
     };
 
     const addMessage = (sender, text, bgClass) => {
@@ -45,20 +95,25 @@ const ChatInterface = ({ templateId, onClose }) => {
             websocket.current.close();
         }
 
-        log(`Connecting to WebSocket at ws://localhost:8000/stream/${templateId}...`);
-        websocket.current = new WebSocket(`ws://localhost:8000/stream/${templateId}`);
+        // user_id attributes the session to the rep's team for analytics
+        const url = `ws://localhost:8000/stream/${templateId}`;
+        const params = new URLSearchParams();
+        if (userId) params.set('user_id', userId);
+        // Only managers have a token; it moves their call up the admission queue
+        if (managerToken) params.set('token', managerToken);
+        log(`Connecting to WebSocket at ${url}...`);
+        websocket.current = new WebSocket(params.toString() ? `${url}?${params}` : url, [SUBPROTOCOL]);
+        websocket.current.binaryType = 'arraybuffer';
         websocket.current.onopen = () => {
             log("WebSocket connection opened");
             setStatus('Waiting for your speech... (Pause briefly after speaking)');
         };
 
         websocket.current.onmessage = async (event) => {
-            const data = JSON.parse(event.data);
+            const data = decodeMessage(event.data);
             if (data.type === 'audio') {
                 log("Received audio delta from backend");
-                const audioData = new Uint8Array(atob(data.data).split('').map(c => c.charCodeAt(0)));
-                const pcm16 = new Int16Array(audioData.buffer);
-                await wavPlayer.current.add16BitPCM(pcm16, 'bot-response');
+                await wavPlayer.current.add16BitPCM(data.pcm16, 'bot-response');
                 setIsSpeaking(true);
             } else if (data.type === 'text') {
                 log(`Received text message: ${JSON.stringify(data.text)}`);
@@ -95,6 +150,16 @@ const ChatInterface = ({ templateId, onClose }) => {
                     addMessage('You', data.text, 'bg-green-100');
                     transcriptionFailures.current = 0;
                 }
+            } else if (data.type === 'queue') {
+                log(`Waiting for a free line, position ${data.position}`);
+                setStatus(`All lines are busy. You are number ${data.position} in the queue...`);
+            } else if (data.type === 'status') {
+                log(`Received upstream status: ${data.status}`);
+                if (data.status === 'reconnecting') {
+                    setStatus('Reconnecting... (Keep talking, nothing is lost)');
+                } else {
+                    setStatus('Waiting for your speech... (Pause briefly after speaking)');
+                }
             } else if (data.type === 'error') {
                 log(`Received error from backend: ${data.message}`);
                 addMessage('Bot', `Error: ${data.message}`, 'bg-red-100');
@@ -151,11 +216,8 @@ const ChatInterface = ({ templateId, onClose }) => {
                 if (speechDetected) {
                     const pcm16 = data.mono;
                     sampleCount.current += pcm16.length;
-                    const buffer = new Uint8Array(pcm16.buffer);
-                    const base64Audio = btoa(String.fromCharCode.apply(null, buffer));
-                    log(`Processed audio chunk: ${buffer.length} bytes`);
-                    if (websocket.current?.readyState === WebSocket.OPEN) {
-                        websocket.current.send(JSON.stringify({ type: 'audio', data: base64Audio }));
+                    log(`Processed audio chunk: ${pcm16.byteLength} bytes`);
+                    if (sendAudio(pcm16)) {
                         log("Sent audio chunk to backend");
                     }
                 }
@@ -174,7 +236,7 @@ const ChatInterface = ({ templateId, onClose }) => {
     const interruptSpeaking = async () => {
         if (!isSpeaking || !websocket.current || websocket.current.readyState !== WebSocket.OPEN) return;
         log("User clicked 'Interrupt' button");
-        websocket.current.send(JSON.stringify({ type: 'interrupt', sampleCount: sampleCount.current }));
+        sendControl({ type: 'interrupt', sampleCount: sampleCount.current });
         await wavPlayer.current.interrupt();
         setIsSpeaking(false);
         setStatus('Waiting for your speech... (Pause briefly after speaking)');